@@ -0,0 +1,104 @@
+"""
+ISABELLA - GENERATION BUDGETS
+Per-length max_tokens and deadline planning, plus tracking of actual output against the budget
+"""
+
+import math
+from collections import defaultdict
+
+# Target word ranges per StoryPrompt.length
+LENGTH_WORDS = {
+    "short": (1000, 2000),
+    "chapter": (3000, 4000),
+    "long": (5000, 8000),
+}
+
+# Provider model id -> (context window, max output tokens)
+MODEL_LIMITS = {
+    "gpt-4o": (128000, 16384),
+    "gpt-4-turbo-preview": (128000, 4096),
+    "gpt-3.5-turbo": (16385, 4096),
+}
+DEFAULT_MODEL_LIMITS = (16385, 4096)
+
+CONTINUATION_TAIL_CHARS = 4000  # how much of a cut-off generation a continuation prompt repeats
+
+TOKENS_PER_WORD = 1.35  # English prose
+OUTPUT_HEADROOM = 1.15  # let the model finish its last scene instead of stopping at the word target
+
+CONTINUE_PROMPT = """{prompt}
+
+YOU HAVE ALREADY WRITTEN THE TEXT BELOW, BUT IT WAS CUT OFF. Continue EXACTLY where it stops:
+same voice, no repetition, no recap, no preamble. Bring the piece to its planned ending.
+
+...{tail}"""
+
+
+def plan_max_tokens(length: str, model: str, prompt_tokens: int) -> int:
+    """Output tokens for the upper end of the requested length, within the model's limits"""
+    context, max_output = MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+    words = LENGTH_WORDS.get(length, LENGTH_WORDS["chapter"])[1]
+    wanted = math.ceil(words * TOKENS_PER_WORD * OUTPUT_HEADROOM)
+    return max(256, min(wanted, max_output, context - prompt_tokens - 64))
+
+
+def length_for_words(words: int) -> str:
+    """Smallest length whose word range covers `words` (used to budget rewrites of existing text)"""
+    for length, (_, upper) in sorted(LENGTH_WORDS.items(), key=lambda item: item[1][1]):
+        if words <= upper:
+            return length
+    return "long"
+
+
+def continuation_prompt(prompt: str, text: str, tail_chars: int = CONTINUATION_TAIL_CHARS) -> str:
+    """Prompt that picks a truncated generation up where it stopped"""
+    return CONTINUE_PROMPT.format(prompt=prompt.strip(), tail=text[-tail_chars:])
+
+
+def join_continuation(text: str, more: str) -> str:
+    if not text or not more or text[-1].isspace() or more[0].isspace() or not more[0].isalnum():
+        return text + more
+    return text + " " + more
+
+
+class BudgetTracker:
+    """
+    Measures output against budgets: tokens used vs. reserved per length, truncations,
+    and a per-model tokens/second estimate that drives call deadlines.
+    """
+
+    def __init__(self, base_seconds: float = 15.0, default_tokens_per_second: float = 50.0, max_seconds: float = 120.0):
+        self.base_seconds = base_seconds
+        self.default_tokens_per_second = default_tokens_per_second
+        self.max_seconds = max_seconds
+        self.throughput = {}  # model -> EWMA tokens/second
+        self.lengths = defaultdict(lambda: {"calls": 0, "budget_tokens": 0, "used_tokens": 0, "truncated": 0, "continuations": 0})
+
+    def deadline(self, model: str, max_tokens: int) -> float:
+        """Seconds a call may take: fixed overhead plus expected generation time with 25% slack"""
+        tokens_per_second = self.throughput.get(model, self.default_tokens_per_second)
+        return min(self.max_seconds, self.base_seconds + 1.25 * max_tokens / tokens_per_second)
+
+    def record(self, length: str, model: str, budget: int, used: int, elapsed: float, truncated: bool, continuations: int):
+        stats = self.lengths[length]
+        stats["calls"] += 1
+        stats["budget_tokens"] += budget
+        stats["used_tokens"] += used
+        stats["truncated"] += truncated
+        stats["continuations"] += continuations
+        if elapsed > 1 and used > 100:
+            observed = used / elapsed
+            previous = self.throughput.get(model, observed)
+            self.throughput[model] = 0.8 * previous + 0.2 * observed
+
+    def stats(self) -> dict:
+        return {
+            "lengths": {
+                length: {
+                    **stats,
+                    "utilization": round(stats["used_tokens"] / stats["budget_tokens"], 3) if stats["budget_tokens"] else 0.0,
+                }
+                for length, stats in self.lengths.items()
+            },
+            "tokens_per_second": {model: round(rate, 1) for model, rate in self.throughput.items()},
+        }
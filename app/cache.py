@@ -0,0 +1,161 @@
+"""
+ISABELLA - IN-PROCESS CACHES
+Thread-safe TTL/LRU cache with single-flight loading
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    """One in-progress load that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _MISSING  # stays missing if a batch load left the key unresolved
+        self.error = None
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl` seconds.
+    `get_or_load` runs the loader once per key even when many threads miss at the same time.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        """Return the live value or _MISSING (caller holds the lock)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, or call `loader()` once and share its result with concurrent callers"""
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.value is not _MISSING:
+                return flight.value
+            # left unresolved by get_or_load_many - load it ourselves
+
+        try:
+            flight.value = loader()
+            self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def get_or_load_many(self, keys, loader) -> dict:
+        """
+        get_or_load for many keys with one loader call: `loader(missing_keys)` returns {key: value}
+        for the keys it resolved, and covers only keys no one else is loading (the rest are
+        waited for). Keys it leaves out (or all of them, if it raises) are not cached, and
+        callers waiting on them load them on their own. Returns every value found.
+        """
+        found, leading, following = {}, {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    found[key] = value
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    following[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    leading[key] = self._inflight[key] = _Flight()
+
+        if leading:
+            try:
+                loaded = loader(list(leading))
+                for key, flight in leading.items():
+                    if key in loaded:
+                        flight.value = found[key] = loaded[key]
+                        self.set(key, flight.value)
+            finally:
+                with self._lock:
+                    for key in leading:
+                        del self._inflight[key]
+                for flight in leading.values():
+                    flight.done.set()
+
+        for key, flight in following.items():
+            flight.done.wait()
+            if flight.error is None and flight.value is not _MISSING:
+                found[key] = flight.value
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
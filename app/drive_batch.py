@@ -0,0 +1,135 @@
+"""
+ISABELLA - DRIVE BATCH REQUESTS
+Independent Drive metadata calls grouped into Drive's batch HTTP endpoint (up to 100 per
+request), with per-call results, and retries of the calls that failed transiently
+"""
+
+import random
+import time
+
+from app.metrics import DRIVE_SECONDS, record_error
+
+MAX_BATCH_CALLS = 100  # Drive's limit per batch request
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+TRANSPORT_ERRORS = ("ServerNotFoundError", "TransportError")  # httplib2 / google-auth, no HTTP status
+
+FILE_FIELDS = "id, name, mimeType, parents, size, modifiedTime, trashed, webViewLink"
+
+BULK_OPERATIONS = ("metadata", "rename", "move", "copy", "trash", "untrash", "delete")
+
+
+def error_status(error: Exception) -> int:
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Server errors, 429s, Drive's 403 rate-limit errors, and connection failures"""
+    status = error_status(error)
+    if status is None:
+        return isinstance(error, OSError) or type(error).__name__ in TRANSPORT_ERRORS
+    if status == 403:
+        content = getattr(error, "content", b"") or b""
+        return any(reason.encode() in content for reason in RATE_LIMIT_REASONS)
+    return status in RETRYABLE_STATUS
+
+
+def operation_request(client, operation: dict):
+    """
+    Drive API request for one bulk operation: {"op", "file_id", "name", "folder_id", "parents"}.
+    `parents` (the file's current parents) is needed for "move".
+    """
+    files = client.files()
+    op, file_id = operation["op"], operation["file_id"]
+    if op == "metadata":
+        return files.get(fileId=file_id, fields=FILE_FIELDS)
+    if op == "rename":
+        return files.update(fileId=file_id, body={"name": operation["name"]}, fields=FILE_FIELDS)
+    if op == "move":
+        return files.update(
+            fileId=file_id, addParents=operation["folder_id"],
+            removeParents=",".join(operation.get("parents") or []), fields=FILE_FIELDS
+        )
+    if op == "copy":
+        body = {key: value for key, value in (("name", operation.get("name")),) if value}
+        if operation.get("folder_id"):
+            body["parents"] = [operation["folder_id"]]
+        return files.copy(fileId=file_id, body=body, fields=FILE_FIELDS)
+    if op in ("trash", "untrash"):
+        return files.update(fileId=file_id, body={"trashed": op == "trash"}, fields=FILE_FIELDS)
+    if op == "delete":
+        return files.delete(fileId=file_id)
+    raise ValueError(f"Unknown Drive operation: {op}")
+
+
+class DriveBatcher:
+    """
+    run(calls) executes `build_request(client)` callables through batch requests on a client
+    checked out of the Drive pool returned by `get_pool()`, and returns one result per call, in
+    order: {"ok": True, "result": ...} or {"ok": False, "error": ..., "status": ...}. Calls that
+    failed transiently (the call itself or the whole batch) are retried together in later
+    batches with exponential backoff, up to `max_attempts`.
+    """
+
+    def __init__(self, get_pool, max_batch: int = MAX_BATCH_CALLS, max_attempts: int = 4, base_delay: float = 1.0):
+        self.get_pool = get_pool
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_CALLS))
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.batches = 0
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+
+    def run(self, calls: list) -> list:
+        results = [None] * len(calls)
+        pending = list(range(len(calls)))
+        for attempt in range(1, self.max_attempts + 1):
+            retry = []
+            for start in range(0, len(pending), self.max_batch):
+                chunk = pending[start:start + self.max_batch]
+                for index, error in self._execute(calls, chunk, results):
+                    if attempt < self.max_attempts and is_retryable(error):
+                        retry.append(index)
+                    else:
+                        results[index] = {"ok": False, "error": str(error), "status": error_status(error)}
+                        self.failed += 1
+            if not retry:
+                break
+            self.retried += len(retry)
+            pending = sorted(retry)
+            time.sleep(min(30.0, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        return results
+
+    def _execute(self, calls: list, chunk: list, results: list) -> list:
+        """One batch request for `chunk`; fills `results` for successes and returns (index, error) failures"""
+        failures = []
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                record_error("drive", exception)
+                failures.append((index, exception))
+            else:
+                results[index] = {"ok": True, "result": response}
+
+        self.batches += 1
+        self.calls += len(chunk)
+        started = time.perf_counter()
+        try:
+            with self.get_pool().client() as client:
+                batch = client.new_batch_http_request(callback=callback)
+                for index in chunk:
+                    batch.add(calls[index](client), request_id=str(index))
+                batch.execute()
+        except Exception as e:
+            DRIVE_SECONDS.labels("batch", "error").observe(time.perf_counter() - started)
+            record_error("drive", e)
+            done = {index for index, _ in failures}
+            return failures + [(index, e) for index in chunk if results[index] is None and index not in done]
+        DRIVE_SECONDS.labels("batch", "ok").observe(time.perf_counter() - started)
+        return failures
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "calls": self.calls, "retried": self.retried, "failed": self.failed}
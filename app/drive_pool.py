@@ -0,0 +1,83 @@
+"""
+ISABELLA - DRIVE CLIENT POOL
+Drive API clients checked out one call at a time (httplib2 connections are not thread-safe),
+all sharing one credentials object whose token refresh is serialized
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+def serialize_refresh(credentials):
+    """
+    Make concurrent refreshes of shared credentials happen once: callers queue on a lock,
+    and a caller whose token was already replaced while it waited skips its own refresh.
+    """
+    lock = threading.Lock()
+    refresh = credentials.refresh
+
+    def locked_refresh(request):
+        token = credentials.token
+        with lock:
+            if credentials.token != token and credentials.valid:
+                return  # another thread refreshed while we waited
+            refresh(request)
+            locked_refresh.count += 1
+
+    locked_refresh.count = 0
+    credentials.refresh = locked_refresh
+    return credentials
+
+
+class DriveClientPool:
+    """
+    Up to `size` clients from `factory()` (each with its own HTTP connection), created on
+    demand. `with pool.client() as drive:` checks one out for the block; callers wait when
+    all of them are busy.
+    """
+
+    def __init__(self, factory, size: int = 8):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+
+    @contextmanager
+    def client(self):
+        client = self._acquire()
+        try:
+            yield client
+        finally:
+            with self._cond:
+                self._idle.append(client)
+                self._cond.notify()
+
+    def _acquire(self):
+        with self._cond:
+            if not self._idle and self._created >= self.size:
+                self.waits += 1
+                self._cond.wait_for(lambda: self._idle or self._created < self.size)
+            self.checkouts += 1
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "clients": self._created,
+                "in_use": self._created - len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+            }
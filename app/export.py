@@ -0,0 +1,276 @@
+"""
+ISABELLA - MANUSCRIPT EXPORT
+A whole project compiled into one Markdown, plain-text or EPUB document, streamed in
+chapter order while the next chapters are still being read, and cached per set of
+chapter revisions
+"""
+
+import asyncio
+import hashlib
+import html
+import itertools
+import json
+import math
+import os
+import uuid
+import zipfile
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+EXPORT_FORMATS = {
+    "md": "text/markdown; charset=utf-8",
+    "txt": "text/plain; charset=utf-8",
+    "epub": "application/epub+zip",
+}
+
+
+def chapter_heading(chapter: dict) -> str:
+    title = (chapter.get("title") or "").replace("_", " ").strip()
+    if not title or title == "continuation":
+        return f"Chapter {chapter['number']}"
+    return f"Chapter {chapter['number']}: {title}"
+
+
+def paragraphs(text: str) -> list:
+    return [part.strip() for part in text.replace("\r\n", "\n").split("\n\n") if part.strip()]
+
+
+class MarkdownWriter:
+    def __init__(self, project: dict, chapters: list):
+        self.project = project
+
+    def begin(self) -> bytes:
+        lines = [f"# {self.project['name']}", ""]
+        if self.project.get("genre"):
+            lines += [f"*{self.project['genre']}*", ""]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def chapter(self, chapter: dict, text: str) -> bytes:
+        return f"## {chapter_heading(chapter)}\n\n{text.strip()}\n\n".encode("utf-8")
+
+    def end(self) -> bytes:
+        return b""
+
+
+class TextWriter(MarkdownWriter):
+    def begin(self) -> bytes:
+        name = self.project["name"]
+        return f"{name}\n{'=' * len(name)}\n\n\n".encode("utf-8")
+
+    def chapter(self, chapter: dict, text: str) -> bytes:
+        heading = chapter_heading(chapter)
+        return f"{heading}\n{'-' * len(heading)}\n\n{text.strip()}\n\n\n".encode("utf-8")
+
+
+class _Sink:
+    """Write-only, unseekable target for zipfile; drain() hands over what was written so far"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+XHTML_PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="en" lang="en">
+<head><title>{title}</title></head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+class EpubWriter:
+    """
+    EPUB 3 written through zipfile into an unseekable sink (entries carry data descriptors),
+    so each chapter's bytes can be sent as soon as it is added. The package document and
+    table of contents only need the chapter list, so they go out first.
+    """
+
+    def __init__(self, project: dict, chapters: list):
+        self.project = project
+        self.chapters = chapters
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def _add(self, name: str, data: str, compress: bool = True) -> bytes:
+        info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zip.writestr(info, data.encode("utf-8"))
+        return self._sink.drain()
+
+    def begin(self) -> bytes:
+        title = html.escape(self.project["name"])
+        identifier = uuid.uuid5(uuid.NAMESPACE_URL, f"isabella:{self.project['name']}")
+        modified = max(chapter["updated_at"] for chapter in self.chapters)[:19] + "Z"
+        manifest = "\n".join(
+            f'    <item id="ch{c["number"]}" href="chapter-{c["number"]}.xhtml" media-type="application/xhtml+xml"/>'
+            for c in self.chapters
+        )
+        spine = "\n".join(f'    <itemref idref="ch{c["number"]}"/>' for c in self.chapters)
+        opf = f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:{identifier}</dc:identifier>
+    <dc:title>{title}</dc:title>
+    <dc:language>en</dc:language>
+    <dc:creator>Isabella</dc:creator>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+{manifest}
+  </manifest>
+  <spine>
+{spine}
+  </spine>
+</package>
+"""
+        toc = "\n".join(
+            f'    <li><a href="chapter-{c["number"]}.xhtml">{html.escape(chapter_heading(c))}</a></li>' for c in self.chapters
+        )
+        nav = XHTML_PAGE.format(title=title, body=f'<nav epub:type="toc" id="toc">\n  <h1>{title}</h1>\n  <ol>\n{toc}\n  </ol>\n</nav>')
+        return (
+            self._add("mimetype", "application/epub+zip", compress=False)  # first and uncompressed, per the OCF spec
+            + self._add("META-INF/container.xml", CONTAINER_XML)
+            + self._add("OEBPS/content.opf", opf)
+            + self._add("OEBPS/nav.xhtml", nav)
+        )
+
+    def chapter(self, chapter: dict, text: str) -> bytes:
+        heading = html.escape(chapter_heading(chapter))
+        body = f"<h2>{heading}</h2>\n" + "\n".join(f"<p>{html.escape(part)}</p>" for part in paragraphs(text))
+        return self._add(f"OEBPS/chapter-{chapter['number']}.xhtml", XHTML_PAGE.format(title=heading, body=body))
+
+    def end(self) -> bytes:
+        self._zip.close()
+        return self._sink.drain()
+
+
+WRITERS = {"md": MarkdownWriter, "txt": TextWriter, "epub": EpubWriter}
+
+
+class ManuscriptExporter:
+    """
+    stream(project, chapters, fmt) yields the compiled document in chapter order. Chapter
+    texts come from blocking `read_chapters(project_name)`, an iterator of chapter rows (with
+    "text") in chapter order; batches of `read_ahead` rows are read in a thread while the
+    previous batch is being written. The output is teed into `cache_dir` under a key built
+    from every chapter's number, revision and update time; cached(project, chapters, fmt)
+    returns that file while the chapters are unchanged. The newest `max_entries` exports are kept.
+    """
+
+    def __init__(self, cache_dir: Path, read_chapters, read_ahead: int = 8, max_entries: int = 64):
+        self.cache_dir = cache_dir
+        self.read_chapters = read_chapters
+        self.read_ahead = max(1, read_ahead)
+        self.max_entries = max(1, max_entries)
+        self.exports = 0
+        self.cache_hits = 0
+        self.bytes_sent = 0
+
+    @staticmethod
+    def export_key(project: dict, chapters: list, fmt: str) -> str:
+        revisions = [[c["number"], c["revision"], c["updated_at"]] for c in chapters]
+        return hashlib.sha256(json.dumps([project["name"], project.get("genre"), fmt, revisions]).encode("utf-8")).hexdigest()
+
+    def _path(self, project: dict, chapters: list, fmt: str) -> Path:
+        return self.cache_dir / f"{self.export_key(project, chapters, fmt)}.{fmt}"
+
+    def cached(self, project: dict, chapters: list, fmt: str) -> Path:
+        path = self._path(project, chapters, fmt)
+        if not path.exists():
+            return None
+        os.utime(path)  # keep recently used exports when pruning
+        self.cache_hits += 1
+        self.bytes_sent += path.stat().st_size
+        return path
+
+    async def _fetched(self, project: dict, chapters: list):
+        """(chapter, row) in chapter order (row is None if the chapter is gone), reading one batch ahead"""
+        rows = self.read_chapters(project["name"])
+
+        def read_batch() -> list:
+            return list(itertools.islice(rows, self.read_ahead))
+
+        listed = deque(chapters)
+        batch = asyncio.ensure_future(asyncio.to_thread(read_batch))
+        try:
+            while listed:
+                current = await batch
+                batch = asyncio.ensure_future(asyncio.to_thread(read_batch)) if current else None
+                for row in current or [{"number": math.inf}]:
+                    while listed and listed[0]["number"] < row["number"]:
+                        yield listed.popleft(), None
+                    if listed and listed[0]["number"] == row["number"]:
+                        yield listed.popleft(), row
+                if batch is None:
+                    break
+        finally:
+            if batch is not None:
+                await asyncio.gather(batch, return_exceptions=True)  # let the reader thread finish with `rows`
+            rows.close()
+
+    async def stream(self, project: dict, chapters: list, fmt: str):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(project, chapters, fmt)
+        part = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        writer = WRITERS[fmt](project, chapters)
+        unchanged = True
+        self.exports += 1
+        with open(part, "wb") as f:
+            try:
+                data = writer.begin()
+                f.write(data)
+                yield data
+                async for chapter, row in self._fetched(project, chapters):
+                    if row is None or row["revision"] != chapter["revision"] or row["updated_at"] != chapter["updated_at"]:
+                        unchanged = False  # revised mid-export: send it, but do not cache it under the old key
+                    data = writer.chapter(chapter, row["text"] if row else "")
+                    f.write(data)
+                    yield data
+                data = writer.end()
+                f.write(data)
+                yield data
+            except BaseException:
+                f.close()
+                part.unlink(missing_ok=True)
+                raise
+        self.bytes_sent += part.stat().st_size
+        if unchanged:
+            os.replace(part, path)
+            self._prune()
+        else:
+            part.unlink(missing_ok=True)
+
+    def _prune(self):
+        exports = sorted(
+            (p for p in self.cache_dir.iterdir() if p.suffix.lstrip(".") in EXPORT_FORMATS),
+            key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        for stale in exports[self.max_entries:]:
+            stale.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"exports": self.exports, "cache_hits": self.cache_hits, "bytes_sent": self.bytes_sent,
+                "read_ahead": self.read_ahead}
@@ -0,0 +1,86 @@
+"""
+ISABELLA - GENERATION CACHE
+Content-addressed cache of generated text (memory tier + on-disk tier)
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from app.cache import TTLCache
+
+
+def generation_key(**inputs) -> str:
+    """Stable hash of everything that shapes a generation (prompts, model, sampling params)"""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Two-tier cache: a small in-memory LRU in front of a directory of `<key>.txt` files.
+    Both tiers expire entries after `ttl` seconds; the disk tier is capped at `disk_max_entries`
+    (oldest files are evicted first).
+    """
+
+    def __init__(self, disk_dir: Path, ttl: float = 86400, memory_entries: int = 64, disk_max_entries: int = 2000):
+        self.disk_dir = disk_dir
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self._memory = TTLCache(maxsize=memory_entries, ttl=ttl)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.txt"
+
+    def get(self, key: str) -> str:
+        text = self._memory.get(key)
+        if text is not None:
+            self.memory_hits += 1
+            return text
+
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime <= self.ttl:
+                text = path.read_text(encoding="utf-8")
+                self._memory.set(key, text)
+                self.disk_hits += 1
+                return text
+            path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+        self.misses += 1
+        return None
+
+    def put(self, key: str, text: str):
+        self._memory.set(key, text)
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._path(key).with_suffix(".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, self._path(key))
+        self.stores += 1
+        self._evict_disk()
+
+    def _evict_disk(self):
+        files = list(self.disk_dir.glob("*.txt"))
+        if len(files) <= self.disk_max_entries:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[:len(files) - self.disk_max_entries]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "memory_entries": self._memory.stats()["size"],
+            "ttl_seconds": self.ttl,
+        }
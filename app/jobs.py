@@ -0,0 +1,169 @@
+"""
+ISABELLA - BACKGROUND JOBS
+SQLite-backed job queue so long generations don't hold HTTP connections open
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class JobStore:
+    """Persists jobs in a local SQLite file so queued work survives a restart"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+
+    def create(self, kind: str, payload: dict) -> dict:
+        now = datetime.now().isoformat()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields) -> dict:
+        fields["updated_at"] = datetime.now().isoformat()
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def unfinished(self) -> list:
+        """Jobs that were queued or running when the process last stopped, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class JobRunner:
+    """
+    Fixed pool of asyncio workers draining the job queue.
+    `handlers` maps a job kind to `async fn(payload, progress) -> dict`.
+    """
+
+    def __init__(self, store: JobStore, handlers: dict, workers: int = 4):
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self._queue = None
+        self._order = []
+        self._tasks = []
+        self._subscribers = {}
+
+    async def start(self):
+        """Requeue unfinished jobs from the store and start the workers"""
+        self._queue = asyncio.Queue()
+        recovered = self.store.unfinished()
+        for job_id in recovered:
+            self.store.update(job_id, status="queued", progress="queued (recovered after restart)")
+            self._enqueue(job_id)
+        if recovered:
+            print(f"✓ Jobs: requeued {len(recovered)} unfinished job(s)")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}' (expected one of: {', '.join(self.handlers)})")
+        job = self.store.create(kind, payload)
+        self._enqueue(job["id"])
+        return self.describe(job)
+
+    def describe(self, job: dict) -> dict:
+        """Public view of a job, with queue position while it is waiting"""
+        view = {key: job[key] for key in ("id", "kind", "status", "progress", "result", "error", "created_at", "updated_at")}
+        if job["status"] == "queued" and job["id"] in self._order:
+            view["queue_position"] = self._order.index(job["id"]) + 1
+        return view
+
+    def get(self, job_id: str) -> dict:
+        job = self.store.get(job_id)
+        return self.describe(job) if job else None
+
+    async def subscribe(self, job_id: str):
+        """Yield the job's public view on every state change until it finishes"""
+        updates = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(updates)
+        try:
+            job = self.get(job_id)
+            while job is not None:
+                yield job
+                if job["status"] in TERMINAL_STATES:
+                    break
+                job = await updates.get()
+        finally:
+            self._subscribers[job_id].discard(updates)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _enqueue(self, job_id: str):
+        self._order.append(job_id)
+        self._queue.put_nowait(job_id)
+
+    def _update(self, job_id: str, **fields):
+        job = self.describe(self.store.update(job_id, **fields))
+        for updates in self._subscribers.get(job_id, ()):
+            updates.put_nowait(job)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._order.remove(job_id)
+            job = self.store.get(job_id)
+            self._update(job_id, status="running", progress="running")
+            try:
+                result = await self.handlers[job["kind"]](
+                    job["payload"],
+                    lambda progress: self._update(job_id, progress=progress),
+                )
+                self._update(job_id, status="succeeded", progress="done", result=result)
+            except asyncio.CancelledError:
+                raise  # shutting down - job stays 'running' and is recovered on restart
+            except Exception as e:
+                self._update(job_id, status="failed", progress="failed", error=str(e))
@@ -0,0 +1,136 @@
+"""
+ISABELLA - LONG CHAPTER GENERATION
+Outline first, write scenes in parallel, then smooth the joins
+"""
+
+import asyncio
+import json
+import re
+
+JOIN_PARAGRAPHS = 2  # paragraphs taken from each side of a scene boundary for the continuity pass
+
+OUTLINE_SYSTEM = "You are a story planner. Reply with a single JSON array and nothing else."
+JOIN_SYSTEM = "You are a line editor. Reply with the rewritten passage only, in the author's voice."
+
+OUTLINE_PROMPT = """
+STORY PROMPT: {prompt}
+GENRE: {genre}
+
+Plan the opening chapter of this story as exactly {scenes} consecutive scenes (about {total_words} words in total).
+Return ONLY a JSON array, one object per scene, in reading order:
+[{{"title": "...", "summary": "2-3 sentences: what happens, whose POV, how it ends"}}]
+"""
+
+SCENE_PROMPT = """
+STORY PROMPT: {prompt}
+GENRE: {genre}
+
+CHAPTER OUTLINE:
+{outline}
+
+WRITE SCENE {number} OF {scenes} ONLY: {title}
+{summary}
+
+- Length: about {words} words
+- Pick up exactly where scene {previous} leaves off and end where scene {next} begins
+- No scene headings, no chapter titles, no recap of other scenes
+- Publishable prose, consistent voice with the rest of the chapter
+
+WRITE SCENE {number} NOW:
+"""
+
+JOIN_PROMPT = """
+The passage below spans the boundary between two scenes of the same chapter, which were written separately.
+Rewrite it so the transition reads as one continuous piece: fix repeated beats, contradictions, tense/POV drift
+and abrupt jumps. Keep the same events, roughly the same length, and the same final sentence's intent.
+Return ONLY the rewritten passage.
+
+PASSAGE:
+{passage}
+"""
+
+
+def split_paragraphs(text: str) -> list:
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def parse_outline(text: str, scenes: int) -> list:
+    """Parse the model's JSON outline, falling back to one scene per non-empty line"""
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    try:
+        outline = json.loads(match.group(0)) if match else []
+        outline = [
+            {"title": str(item.get("title", f"Scene {i + 1}")), "summary": str(item.get("summary", ""))}
+            for i, item in enumerate(outline) if isinstance(item, dict)
+        ]
+    except ValueError:
+        outline = []
+    if not outline:
+        lines = [line.strip(" -*#0123456789.") for line in text.splitlines() if line.strip()]
+        outline = [{"title": f"Scene {i + 1}", "summary": line} for i, line in enumerate(lines)]
+    return outline[:scenes] or [{"title": "Scene 1", "summary": "The whole chapter"}]
+
+
+async def generate_long_chapter(prompt: str, genre: str, generate, scenes: int = 4, total_words: int = 6500) -> str:
+    """
+    Write a long chapter as `scenes` scenes generated concurrently.
+    `generate(prompt, max_tokens, system)` is an awaitable writer-model call (system None:
+    the writer's own instruction, used for the scene drafts); every call goes through the
+    caller's scheduler, so scenes share the global concurrency limit.
+    Wall-clock time is roughly outline + slowest scene + slowest join.
+    """
+    genre = genre if genre != "auto" else "Determine the best genre for this story"
+    outline = parse_outline(
+        await generate(
+            OUTLINE_PROMPT.format(prompt=prompt, genre=genre, scenes=scenes, total_words=total_words), 1000, OUTLINE_SYSTEM
+        ),
+        scenes
+    )
+    outline_text = "\n".join(f"{i + 1}. {scene['title']}: {scene['summary']}" for i, scene in enumerate(outline))
+    words = total_words // len(outline)
+
+    drafts = await asyncio.gather(*[
+        generate(
+            SCENE_PROMPT.format(
+                prompt=prompt, genre=genre, outline=outline_text, scenes=len(outline),
+                number=i + 1, title=scene["title"], summary=scene["summary"], words=words,
+                previous=i if i > 0 else "(chapter start)", next=i + 2 if i + 1 < len(outline) else "(chapter end)",
+            ),
+            int(words * 1.6) + 400,
+            None
+        )
+        for i, scene in enumerate(outline)
+    ])
+    return await smooth_joins([split_paragraphs(draft) for draft in drafts], generate)
+
+
+async def smooth_joins(scenes: list, generate) -> str:
+    """
+    Rewrite the last/first paragraphs around every scene boundary (concurrently) and
+    splice the results back. A failed continuity pass keeps the original paragraphs.
+    """
+    heads = [0] + [min(JOIN_PARAGRAPHS, len(paragraphs) // 2) for paragraphs in scenes[1:]]
+    tails = [min(JOIN_PARAGRAPHS, len(paragraphs) // 2) for paragraphs in scenes[:-1]] + [0]
+    seams = [
+        scenes[i][len(scenes[i]) - tails[i]:] + scenes[i + 1][:heads[i + 1]]
+        for i in range(len(scenes) - 1)
+    ]
+
+    async def smooth(seam: list) -> list:
+        passage = "\n\n".join(seam)
+        try:
+            rewritten = split_paragraphs(await generate(
+                JOIN_PROMPT.format(passage=passage), int(len(passage.split()) * 2) + 200, JOIN_SYSTEM
+            ))
+            return rewritten or seam
+        except Exception:
+            return seam
+
+    joins = await asyncio.gather(*[smooth(seam) for seam in seams])
+
+    paragraphs = []
+    for i, scene in enumerate(scenes):
+        paragraphs.extend(scene[heads[i]:len(scene) - tails[i]])
+        if i < len(joins):
+            paragraphs.extend(joins[i])
+    return "\n\n".join(paragraphs)
@@ -4,30 +4,61 @@ Advanced FastAPI Backend for Professional Story Generation
 Version 5.0 - Elite Writer Architecture
 """
 
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
 import os
 import json
-import requests
+import re
+import httpx
+import importlib.util
 from io import BytesIO
 from datetime import datetime
 from pathlib import Path
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# Google Drive & Auth libraries are imported where the Drive client is built and used (keeps imports fast)
 
-# Google Drive & Auth
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+from app.scheduler import GenerationScheduler, GenerationQueueFull, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BATCH, priority_floor
+from app.jobs import JobStore, JobRunner
+from app.cache import TTLCache
+from app.uploads import UploadPipeline
+from app.spool import TextStats, count_words
+from app.gen_cache import GenerationCache, generation_key
+from app.longform import generate_long_chapter, split_paragraphs
+from app.routing import ProviderRouter, ProviderError, ProviderRateLimited, Completion, record_completion
+from app.ratelimit import RateLimiter, estimate_tokens, CHARS_PER_TOKEN
+from app.budget import (
+    BudgetTracker, plan_max_tokens, continuation_prompt, join_continuation, length_for_words, CONTINUATION_TAIL_CHARS
+)
+from app.mock_provider import MockProvider
+from app.memory import StoryMemory, MEMORY_SYSTEM, render_memory
+from app.story_index import StoryIndex
+from app.drive_pool import DriveClientPool, serialize_refresh
+from app.drive_batch import DriveBatcher, operation_request, BULK_OPERATIONS
+from app.resumable import ResumableUploader
+from app.export import ManuscriptExporter, EXPORT_FORMATS
+from app.revision import locate_spans, merge_spans, revise_spans, diff_stats
+from app.tracing import tracer, traced, current_span, JsonlExporter, StdoutExporter, TracingMiddleware
+from app.metrics import (
+    MetricsMiddleware, render_metrics, monitor_event_loop, record_error,
+    PROVIDER_SECONDS, PROVIDER_TTFT_SECONDS, DRIVE_SECONDS, DRIVE_UPLOAD_BYTES, QUEUE_DEPTH, UPLOAD_PENDING
+)
 
 # ========================================
 # CONFIGURATION
 # ========================================
 
 SCOPES = ["https://www.googleapis.com/auth/drive"]
+
+# Local state (job queue etc.) lives here - mount a volume on Railway to keep it across deploys
+DATA_DIR = Path(os.environ.get("ISABELLA_DATA_DIR", ".isabella"))
 DRIVE_FOLDER_ID = "1UNIpr8fEWbGccnyAAu01kwXa6xwPdkFk"  # ISA_BRAIN root
 
 # API Configuration - Support both OpenAI and OpenRouter
@@ -50,13 +81,29 @@ if not OPENROUTER_API_KEY:
 OPENAI_BASE_URL = "https://api.openai.com/v1"
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
-# Determine which provider to use (priority: env var > OPENAI > OPENROUTER)
+# Determine which provider to prefer (priority: env var > OPENAI > OPENROUTER); "mock" runs offline
 API_PROVIDER = os.environ.get("API_PROVIDER", "openai").lower()
 if API_PROVIDER == "openrouter" and not OPENROUTER_API_KEY:
     API_PROVIDER = "openai"
 if API_PROVIDER == "openai" and not OPENAI_API_KEY:
     API_PROVIDER = "openrouter"
 
+# Client-side RPM/TPM limits, e.g. {"openai": {"rpm": 500, "tpm": 150000}, "openai:gpt-4o": {"tpm": 30000}}
+# Per-model limits are also learned from the providers' x-ratelimit-* headers
+PROVIDER_RATE_LIMITS = json.loads(os.environ.get("PROVIDER_RATE_LIMITS", "{}"))
+
+# Routing across providers: circuit breaker + optional hedged requests
+ROUTER_FAILURE_THRESHOLD = int(os.environ.get("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN = float(os.environ.get("ROUTER_COOLDOWN", "30"))
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "0").lower() in ("1", "true", "on")
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "5"))
+
+# Local mock provider (API_PROVIDER=mock, or MOCK_PROVIDER=1 to add it as a last-resort fallback)
+MOCK_PROVIDER_ENABLED = API_PROVIDER == "mock" or os.environ.get("MOCK_PROVIDER", "0").lower() in ("1", "true", "on")
+MOCK_LATENCY = float(os.environ.get("MOCK_LATENCY", "0.5"))
+MOCK_TOKENS_PER_SECOND = float(os.environ.get("MOCK_TOKENS_PER_SECOND", "0"))
+MOCK_ERROR_RATE = float(os.environ.get("MOCK_ERROR_RATE", "0"))
+
 # Primary writing models (in priority order)
 WRITING_MODELS = {
     "gpt-4o": "gpt-4o",                                       # Best for narrative & dialogue
@@ -64,12 +111,88 @@ WRITING_MODELS = {
     "gpt-3-5-turbo": "gpt-3.5-turbo",                         # Fast, cost-effective
 }
 
+# Sampling parameters sent with every chat completion (max_tokens is budgeted per request length)
+SAMPLING_PARAMS = {
+    "temperature": 0.9,
+    "top_p": 0.95,
+}
+
+# Deadlines: fixed overhead + budgeted tokens at the measured (initially assumed) tokens/second, capped at PROVIDER_TIMEOUT
+DEADLINE_BASE_SECONDS = float(os.environ.get("DEADLINE_BASE_SECONDS", "15"))
+ASSUMED_TOKENS_PER_SECOND = float(os.environ.get("ASSUMED_TOKENS_PER_SECOND", "50"))
+STREAM_IDLE_TIMEOUT = float(os.environ.get("STREAM_IDLE_TIMEOUT", "30"))
+MAX_CONTINUATIONS = int(os.environ.get("MAX_CONTINUATIONS", "2"))  # follow-up calls when output hits max_tokens
+
+# Shared provider HTTP clients (keep-alive pool per provider, HTTP/2 when h2 is installed)
+PROVIDER_TIMEOUT = float(os.environ.get("PROVIDER_TIMEOUT", "120"))
+PROVIDER_MAX_CONNECTIONS = int(os.environ.get("PROVIDER_MAX_CONNECTIONS", "20"))
+PROVIDER_KEEPALIVE_EXPIRY = float(os.environ.get("PROVIDER_KEEPALIVE_EXPIRY", "300"))
+PROVIDER_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Generation admission control (concurrent provider calls + bounded wait queue)
+GENERATION_MAX_CONCURRENCY = int(os.environ.get("GENERATION_MAX_CONCURRENCY", "8"))
+GENERATION_MAX_QUEUE = int(os.environ.get("GENERATION_MAX_QUEUE", "32"))
+
+# Background job workers (generate-then-save pipelines run off the request path)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+
+# Drive folder-id cache for get_or_create_folder
+FOLDER_CACHE_TTL = float(os.environ.get("FOLDER_CACHE_TTL", "3600"))
+FOLDER_CACHE_SIZE = int(os.environ.get("FOLDER_CACHE_SIZE", "512"))
+
+# Drive API clients (one HTTP connection each, shared credentials) for concurrent Drive calls
+DRIVE_POOL_SIZE = int(os.environ.get("DRIVE_POOL_SIZE", "8"))
+
+# Files from DRIVE_RESUMABLE_MIN_BYTES up are sent with resumable uploads in chunks of
+# DRIVE_UPLOAD_CHUNK_SIZE (rounded down to a multiple of 256 KiB); the session survives retries and restarts
+DRIVE_UPLOAD_URL = os.environ.get("DRIVE_UPLOAD_URL", "https://www.googleapis.com/upload/drive/v3/files")
+DRIVE_UPLOAD_CHUNK_SIZE = int(os.environ.get("DRIVE_UPLOAD_CHUNK_SIZE", str(2 * 1024 * 1024)))
+DRIVE_RESUMABLE_MIN_BYTES = int(os.environ.get("DRIVE_RESUMABLE_MIN_BYTES", str(256 * 1024)))
+
+# Write-behind Drive uploads (each worker checks a client out of the Drive pool per call)
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", str(DRIVE_POOL_SIZE)))
+UPLOAD_MAX_ATTEMPTS = int(os.environ.get("UPLOAD_MAX_ATTEMPTS", "5"))
+
+# Content-addressed cache for identical /story/create generations
+GENERATION_CACHE_ENABLED = os.environ.get("GENERATION_CACHE", "1").lower() not in ("0", "false", "off")
+GENERATION_CACHE_TTL = float(os.environ.get("GENERATION_CACHE_TTL", "86400"))
+GENERATION_CACHE_MEMORY_ENTRIES = int(os.environ.get("GENERATION_CACHE_MEMORY_ENTRIES", "64"))
+GENERATION_CACHE_DISK_ENTRIES = int(os.environ.get("GENERATION_CACHE_DISK_ENTRIES", "2000"))
+
+# length="long" chapters: outline, then this many scenes written in parallel (<= 1 uses a single call)
+LONG_CHAPTER_SCENES = int(os.environ.get("LONG_CHAPTER_SCENES", "4"))
+
+# Upper bound on items per POST /story/batch
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50"))
+
+# POST /drive/bulk: operations per request (sent to Drive in batch requests of up to 100 calls)
+DRIVE_BULK_MAX_OPERATIONS = int(os.environ.get("DRIVE_BULK_MAX_OPERATIONS", "1000"))
+DRIVE_BATCH_MAX_ATTEMPTS = int(os.environ.get("DRIVE_BATCH_MAX_ATTEMPTS", "4"))
+
+# GET /story/{project}/export: chapters read per batch (one batch ahead of the one being written), and compiled exports kept
+EXPORT_READ_AHEAD = int(os.environ.get("EXPORT_READ_AHEAD", "8"))
+EXPORT_CACHE_ENTRIES = int(os.environ.get("EXPORT_CACHE_ENTRIES", "64"))
+
+# Tracing: share of requests exported, plus every request slower than TRACE_SLOW_SECONDS (or failed)
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_SECONDS = float(os.environ.get("TRACE_SLOW_SECONDS", "60"))
+TRACE_EXPORTERS = [name.strip() for name in os.environ.get("TRACE_EXPORTER", "jsonl").split(",") if name.strip()]  # jsonl, stdout, none
+TRACE_FILE = Path(os.environ.get("TRACE_FILE", str(DATA_DIR / "traces.jsonl")))
+
+# Drive API discovery document: the copy bundled with google-api-python-client unless a file is given
+DRIVE_DISCOVERY_DOC = os.environ.get("DRIVE_DISCOVERY_DOC", "")
+
+# Model that keeps each project's rolling story memory up to date (runs at batch priority)
+MEMORY_MODEL = os.environ.get("MEMORY_MODEL", "gpt-4o")
+
 # ========================================
 # GOOGLE DRIVE AUTHENTICATION
 # ========================================
 
 def get_drive_service():
-    """Initialize Google Drive service with OAuth"""
+    """Initialize the pool of Google Drive clients with OAuth (one client is built up front)"""
+    global drive_credentials
+    from google.oauth2.credentials import Credentials
     creds = None
     
     # Railway production - env variable
@@ -95,17 +218,60 @@ def get_drive_service():
     
     # If still no creds, continue anyway (API will degrade gracefully)
     if creds:
-        return build("drive", "v3", credentials=creds)
+        from googleapiclient.discovery import build_from_document
+        drive_credentials = serialize_refresh(creds)
+        pool = DriveClientPool(
+            lambda: build_from_document(drive_discovery_document(), credentials=creds),
+            size=DRIVE_POOL_SIZE
+        )
+        with pool.client():
+            pass
+        return pool
     else:
         print("⚠ Google Drive will not be available (no credentials)")
         return None
 
+_drive_discovery = None
+
+def drive_discovery_document() -> str:
+    """Drive v3 discovery document, read once from disk (no network fetch, no discovery cache lookups)"""
+    global _drive_discovery
+    if _drive_discovery is None:
+        if DRIVE_DISCOVERY_DOC:
+            _drive_discovery = Path(DRIVE_DISCOVERY_DOC).read_text(encoding="utf-8")
+        else:
+            from googleapiclient.discovery_cache import get_static_doc
+            _drive_discovery = get_static_doc("drive", "v3")
+    return _drive_discovery
+
+# DriveClientPool, built on first use (or by the startup task) so importing the app stays fast
+drive = None
+drive_credentials = None  # shared by the pooled clients and the resumable-upload sessions
+drive_init = {"done": False, "seconds": None, "error": None}
+_drive_lock = threading.Lock()
 
-try:
-    drive = get_drive_service()
-except Exception as e:
-    print(f"ERROR: Google Drive not initialized: {str(e)}")
-    drive = None
+def get_drive():
+    """The Google Drive client pool, built on first call (None when Drive is unavailable)"""
+    global drive
+    if drive is not None or drive_init["done"]:
+        return drive
+    with _drive_lock:
+        if not drive_init["done"]:
+            started = time.perf_counter()
+            try:
+                drive = get_drive_service()
+            except Exception as e:
+                print(f"ERROR: Google Drive not initialized: {str(e)}")
+                drive_init["error"] = str(e)
+            drive_init["seconds"] = round(time.perf_counter() - started, 3)
+            drive_init["done"] = True
+    return drive
+
+async def drive_available() -> bool:
+    """Whether Drive can be used, building the client off the event loop if it isn't ready yet"""
+    if drive is not None or drive_init["done"]:
+        return drive is not None
+    return await asyncio.to_thread(get_drive) is not None
 
 # ========================================
 # FASTAPI APP
@@ -121,6 +287,53 @@ app = FastAPI(
     }]
 )
 
+generation_scheduler = GenerationScheduler(GENERATION_MAX_CONCURRENCY, GENERATION_MAX_QUEUE)
+
+def busy_response(e: GenerationQueueFull) -> JSONResponse:
+    """429 with Retry-After when the generation queue (or the provider's rate limit) is saturated"""
+    if isinstance(e, GenerationQueueFull):
+        record_error("scheduler", e)  # provider rate limits are counted where they are raised
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(e), "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+# ========================================
+# LIFECYCLE
+# ========================================
+
+background_tasks = []
+
+def run_in_background(coro) -> asyncio.Task:
+    """Start a task that stays referenced (and is cancelled at shutdown) until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.append(task)
+    task.add_done_callback(background_tasks.remove)
+    return task
+
+@app.on_event("startup")
+async def startup():
+    """Warm provider connection pools and resume staged uploads and queued jobs before serving traffic"""
+    started = time.perf_counter()
+    background_tasks.append(asyncio.create_task(asyncio.to_thread(get_drive)))  # Drive client builds in the background
+    await warm_provider_clients()
+    await upload_pipeline.start()
+    sync_story_index()
+    await job_runner.start()
+    background_tasks.append(asyncio.create_task(monitor_event_loop()))
+    startup_timings["startup_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"✓ Startup complete ({startup_timings['import_seconds']}s import, {startup_timings['startup_seconds']}s startup)")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop job and upload workers and release pooled provider connections"""
+    for task in list(background_tasks):
+        task.cancel()
+    await job_runner.stop()
+    await upload_pipeline.stop()
+    await close_provider_clients()
+
 # ========================================
 # CORS CONFIGURATION
 # ========================================
@@ -133,6 +346,18 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Request latency histograms for GET /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Root span per request (trace id from traceparent / X-Trace-Id, echoed back as X-Trace-Id)
+tracer.sample_rate = TRACE_SAMPLE_RATE
+tracer.slow_seconds = TRACE_SLOW_SECONDS
+if "jsonl" in TRACE_EXPORTERS:
+    tracer.add_exporter(JsonlExporter(TRACE_FILE))
+if "stdout" in TRACE_EXPORTERS:
+    tracer.add_exporter(StdoutExporter())
+app.add_middleware(TracingMiddleware)
+
 # ========================================
 # DATA MODELS
 # ========================================
@@ -143,6 +368,8 @@ class StoryPrompt(BaseModel):
     length: str = "chapter"  # chapter (3-4k), short (1-2k), long (5-8k)
     project_name: str = "Isabella_Stories"
     model: str = "gpt-4o"
+    cache: bool = True  # reuse an identical earlier generation; false forces a fresh one
+    overwrite: bool = False  # replace the project's chapter 1 (as a new revision; later chapters are kept)
 
 class StoryTitle(BaseModel):
     project_name: str
@@ -150,7 +377,7 @@ class StoryTitle(BaseModel):
 
 class ContinueStory(BaseModel):
     project_name: str
-    context: str  # Brief recap of where story left off
+    context: Optional[str] = None  # Optional direction for the next chapter (required only if the project has no story memory)
     model: str = "gpt-4o"
 
 class ReviseChapter(BaseModel):
@@ -158,35 +385,14 @@ class ReviseChapter(BaseModel):
     chapter_num: int
     feedback: str  # What needs to change (tone, pacing, etc.)
     model: str = "gpt-4o"
+    mode: str = "auto"  # "partial" rewrites only affected paragraphs, "full" the whole chapter, "auto" decides
+    paragraphs: Optional[List[int]] = None  # 1-based paragraphs to revise (skips locating them)
 
 # ========================================
 # OPENAI INTEGRATION
 # ========================================
 
-def call_writer_model(prompt: str, model: str = "gpt-4o", system_instruction: str = None) -> str:
-    """
-    Call AI API (OpenAI or OpenRouter) with Isabella system instruction
-    Returns generated story text
-    Automatically selects based on API_PROVIDER and available keys
-    """
-    
-    provider = API_PROVIDER
-    
-    # If OpenAI is preferred but not available, use OpenRouter
-    if provider == "openai" and not OPENAI_API_KEY:
-        provider = "openrouter"
-    if provider == "openrouter" and not OPENROUTER_API_KEY:
-        provider = "openai"
-    
-    if provider == "openai" and not OPENAI_API_KEY:
-        raise RuntimeError("No API keys configured (OPENAI_API_KEY or OPENROUTER_API_KEY required)")
-    if provider == "openrouter" and not OPENROUTER_API_KEY:
-        raise RuntimeError("No API keys configured (OPENAI_API_KEY or OPENROUTER_API_KEY required)")
-    
-    model_key = WRITING_MODELS.get(model, WRITING_MODELS["gpt-4o"])
-    
-    # Isabella master system instruction
-    system = system_instruction or """You are Isabella, a master storyteller and professional author with 20+ years of published experience across fiction, screenwriting, and long-form narrative.
+ISABELLA_SYSTEM_INSTRUCTION = """You are Isabella, a master storyteller and professional author with 20+ years of published experience across fiction, screenwriting, and long-form narrative.
 
 CRITICAL DIRECTIVES:
 1. Write publishable-quality prose immediately (not drafts)
@@ -206,139 +412,426 @@ YOUR RESPONSIBILITY:
 - Deliver work that would be accepted by major literary agents
 
 WRITE NOW. No explanations. No outlines. Only complete scenes."""
-    
-    if provider == "openai":
-        return _call_openai(model_key, system, prompt)
-    else:
-        return _call_openrouter(model_key, system, prompt)
 
-def _call_openai(model: str, system: str, prompt: str) -> str:
-    """Call OpenAI API"""
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
+@traced()
+async def call_writer_model(prompt: str, model: str = "gpt-4o", system_instruction: str = None, max_tokens: int = None, length: str = "chapter") -> str:
+    """
+    Call AI API (OpenAI or OpenRouter) with Isabella system instruction
+    Returns generated story text
+    The provider router picks the healthiest configured provider and fails over on errors
+    max_tokens defaults to the budget for `length`; output cut off at the budget is continued automatically
+    """
+    model_key = WRITING_MODELS.get(model, WRITING_MODELS["gpt-4o"])
+    system = system_instruction or ISABELLA_SYSTEM_INSTRUCTION
+    max_tokens = max_tokens or plan_max_tokens(length, model_key, estimate_tokens(system, prompt))
+    timeout = budget_tracker.deadline(model_key, max_tokens)
     
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.9,
-        "max_tokens": 8000,
-        "top_p": 0.95,
-    }
+    started = time.monotonic()
+    completion = await provider_router.call(model_key, system, prompt, max_tokens, timeout)
+    text, used, truncated = completion.text, completion.completion_tokens, completion.finish_reason == "length"
+    continuations = 0
+    while completion.finish_reason == "length" and continuations < MAX_CONTINUATIONS:
+        continuations += 1
+        completion = await provider_router.call(model_key, system, continuation_prompt(prompt, text), max_tokens, timeout)
+        text = join_continuation(text, completion.text)
+        used += completion.completion_tokens
     
-    try:
-        response = requests.post(
-            f"{OPENAI_BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
-        else:
-            raise RuntimeError("Invalid OpenAI response")
+    budget_tracker.record(length, model_key, max_tokens, used, time.monotonic() - started, truncated, continuations)
+    current_span().set(model=model_key, length=length, max_tokens=max_tokens, completion_tokens=used, continuations=continuations)
+    return text
+
+async def stream_writer_model(prompt: str, model: str = "gpt-4o", system_instruction: str = None, length: str = "chapter"):
+    """
+    Stream story text from the routed provider as it is generated.
+    Fails over to the next provider only if nothing has been streamed yet,
+    and keeps streaming a continuation if the output hits its token budget.
+    """
+    if not provider_router.preference:
+        raise RuntimeError("No API keys configured (OPENAI_API_KEY or OPENROUTER_API_KEY required)")
+    model_key = WRITING_MODELS.get(model, WRITING_MODELS["gpt-4o"])
+    system = system_instruction or ISABELLA_SYSTEM_INSTRUCTION
+    max_tokens = plan_max_tokens(length, model_key, estimate_tokens(system, prompt))
+    timeout = budget_tracker.deadline(model_key, max_tokens)
     
-    except Exception as e:
-        raise RuntimeError(f"OpenAI API error: {str(e)}")
+    started = time.monotonic()
+    text = TextStats(tail_chars=CONTINUATION_TAIL_CHARS)  # only the tail is kept for continuation prompts
+    used, continuations, truncated = 0, 0, False
+    current_prompt = prompt
+    while True:
+        outcome = {}
+        round_chars = 0
+        async for delta in _stream_routed(model_key, system, current_prompt, max_tokens, timeout, outcome):
+            text.feed(delta)
+            round_chars += len(delta)
+            yield delta
+        round_tokens = outcome.get("completion_tokens") or round_chars // CHARS_PER_TOKEN + 1  # provider count, else an estimate
+        used += round_tokens
+        if outcome.get("finish_reason") != "length" or continuations >= MAX_CONTINUATIONS:
+            break
+        truncated = True
+        continuations += 1
+        current_prompt = continuation_prompt(prompt, text.tail)
+        if not text.tail[-1:].isspace():
+            text.feed(" ")
+            yield " "
+    
+    budget_tracker.record(length, model_key, max_tokens, used, time.monotonic() - started, truncated, continuations)
 
-def _call_openrouter(model: str, system: str, prompt: str) -> str:
-    """Call OpenRouter API"""
-    headers = {
+async def _stream_routed(model_key: str, system: str, prompt: str, max_tokens: int, timeout: float, outcome: dict):
+    """One streamed completion from the best provider (failover only before the first token)"""
+    last_error = None
+    for name in provider_router.candidates():
+        started = time.monotonic()
+        streamed = 0  # characters
+        try:
+            async for delta in provider_streams[name](model_key, system, prompt, max_tokens, timeout, outcome):
+                if not streamed:
+                    PROVIDER_TTFT_SECONDS.labels(name, model_key).observe(time.monotonic() - started)
+                streamed += len(delta)
+                yield delta
+            provider_router.record(name, time.monotonic() - started, True)
+            record_completion(
+                name, model_key, time.monotonic() - started,
+                estimate_tokens(system, prompt), outcome.get("completion_tokens") or streamed // CHARS_PER_TOKEN + 1
+            )
+            return
+        except ProviderError as e:
+            if e.retryable:
+                provider_router.record(name, time.monotonic() - started, False)
+            PROVIDER_SECONDS.labels(name, model_key, "error").observe(time.monotonic() - started)
+            record_error("provider", e)
+            if streamed or not e.retryable:
+                raise
+            last_error = e
+    raise last_error
+
+_provider_clients = {}
+
+def _provider_headers(provider: str) -> dict:
+    """Auth and attribution headers for a provider"""
+    if provider == "openai":
+        return {
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://github.com/cmrstudio56/gpt-fastapi-backend",
         "X-Title": "Isabella Story Generator"
     }
-    
-    payload = {
+
+def get_provider_client(provider: str) -> httpx.AsyncClient:
+    """Return the long-lived pooled client for a provider, creating it on first use"""
+    client = _provider_clients.get(provider)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=OPENAI_BASE_URL if provider == "openai" else OPENROUTER_BASE_URL,
+            headers=_provider_headers(provider),
+            timeout=httpx.Timeout(PROVIDER_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=PROVIDER_MAX_CONNECTIONS,
+                keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+            ),
+            http2=PROVIDER_HTTP2,
+        )
+        _provider_clients[provider] = client
+    return client
+
+async def warm_provider_clients():
+    """Open a pooled connection to each configured provider so the first story skips the TLS handshake"""
+    for provider, key in (("openai", OPENAI_API_KEY), ("openrouter", OPENROUTER_API_KEY)):
+        if not key:
+            continue
+        try:
+            await get_provider_client(provider).get("/models", timeout=10.0)
+            print(f"✓ {provider}: connection pool warmed")
+        except Exception as e:
+            print(f"WARNING: Failed to warm {provider} connection: {str(e)}")
+
+async def close_provider_clients():
+    """Close all pooled provider connections"""
+    for client in _provider_clients.values():
+        await client.aclose()
+    _provider_clients.clear()
+
+rate_limiter = RateLimiter(PROVIDER_RATE_LIMITS)
+budget_tracker = BudgetTracker(DEADLINE_BASE_SECONDS, ASSUMED_TOKENS_PER_SECOND, PROVIDER_TIMEOUT)
+
+def _check_rate_limit(provider: str, model: str, label: str, response: httpx.Response):
+    """Feed rate-limit headers to the limiter; a 429 raises ProviderRateLimited with the provider's Retry-After"""
+    retry_after = rate_limiter.update_from_headers(provider, model, response.headers, response.status_code)
+    if retry_after is not None:
+        raise ProviderRateLimited(f"{label} rate limit reached, retry in {retry_after:.0f}s", retry_after)
+
+def _provider_error(label: str, e: Exception) -> ProviderError:
+    """Wrap a provider failure; rate limits, 5xx and network errors are retryable (count against health)"""
+    if isinstance(e, ProviderError):
+        return e
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return ProviderError(f"{label} API error: {str(e)}", retryable=status == 429 or status >= 500)
+    if isinstance(e, asyncio.TimeoutError):
+        return ProviderError(f"{label} API error: no response within the request deadline")
+    return ProviderError(f"{label} API error: {str(e)}", retryable=isinstance(e, (httpx.TransportError, ValueError)))
+
+def _chat_payload(model: str, system: str, prompt: str, max_tokens: int) -> dict:
+    """Chat completion request body shared by both providers"""
+    return {
         "model": model,
         "messages": [
             {"role": "system", "content": system},
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0.9,
-        "max_tokens": 8000,
-        "top_p": 0.95,
+        **SAMPLING_PARAMS,
+        "max_tokens": max_tokens,
     }
+
+async def _chat_completion(provider: str, model: str, system: str, prompt: str, max_tokens: int, timeout: float = None) -> Completion:
+    """POST a chat completion through the provider's pooled client, giving up after `timeout` seconds"""
+    label = "OpenAI" if provider == "openai" else "OpenRouter"
+    payload = _chat_payload(model, system, prompt, max_tokens)
+    reserved = estimate_tokens(system, prompt) + payload["max_tokens"]
     
     try:
-        response = requests.post(
-            f"{OPENROUTER_BASE_URL}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=120
+        await rate_limiter.acquire(
+            provider, model, reserved, generation_scheduler.released, generation_scheduler.current_priority()
+        )
+        response = await asyncio.wait_for(
+            get_provider_client(provider).post("/chat/completions", json=payload),
+            timeout
         )
+        _check_rate_limit(provider, model, label, response)
         response.raise_for_status()
         
         result = response.json()
+        usage = result.get("usage") or {}
+        rate_limiter.settle(provider, model, reserved, usage.get("total_tokens"))
         if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
+            content = result["choices"][0]["message"]["content"]
+            return Completion(
+                content,
+                result["choices"][0].get("finish_reason"),
+                usage.get("completion_tokens") or estimate_tokens(content),
+                usage.get("prompt_tokens") or estimate_tokens(system, prompt)
+            )
         else:
-            raise RuntimeError("Invalid OpenRouter response")
+            raise ProviderError(f"Invalid {label} response")
+    
+    except Exception as e:
+        raise _provider_error(label, e)
+
+async def _stream_chat_completion(provider: str, model: str, system: str, prompt: str, max_tokens: int,
+                                  timeout: float = None, outcome: dict = None):
+    """
+    Stream a chat completion, yielding content deltas from the provider's SSE feed.
+    Stalls longer than STREAM_IDLE_TIMEOUT or running past `timeout` raise; the finish
+    reason is written to `outcome`.
+    """
+    label = "OpenAI" if provider == "openai" else "OpenRouter"
+    payload = _chat_payload(model, system, prompt, max_tokens)
+    payload["stream"] = True
+    deadline = time.monotonic() + (timeout or PROVIDER_TIMEOUT)
+    outcome = outcome if outcome is not None else {}
+    
+    try:
+        await rate_limiter.acquire(
+            provider, model, estimate_tokens(system, prompt) + max_tokens,
+            generation_scheduler.released, generation_scheduler.current_priority()
+        )
+        async with get_provider_client(provider).stream(
+            "POST", "/chat/completions", json=payload,
+            timeout=httpx.Timeout(STREAM_IDLE_TIMEOUT, connect=10.0)
+        ) as response:
+            _check_rate_limit(provider, model, label, response)
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue  # blank separators and ": keep-alive" comments
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if choices and choices[0].get("finish_reason"):
+                    outcome["finish_reason"] = choices[0]["finish_reason"]
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    yield delta
+                if time.monotonic() > deadline:
+                    raise asyncio.TimeoutError()
     
     except Exception as e:
-        raise RuntimeError(f"OpenRouter API error: {str(e)}")
+        raise _provider_error(label, e)
+
+async def _call_openai(model: str, system: str, prompt: str, max_tokens: int, timeout: float = None) -> Completion:
+    """Call OpenAI API"""
+    return await _chat_completion("openai", model, system, prompt, max_tokens, timeout)
+
+async def _call_openrouter(model: str, system: str, prompt: str, max_tokens: int, timeout: float = None) -> Completion:
+    """Call OpenRouter API"""
+    return await _chat_completion("openrouter", model, system, prompt, max_tokens, timeout)
+
+mock_provider = MockProvider(MOCK_LATENCY, MOCK_TOKENS_PER_SECOND, MOCK_ERROR_RATE)
+
+provider_calls = {"openai": _call_openai, "openrouter": _call_openrouter, "mock": mock_provider.complete}
+provider_streams = {
+    "openai": lambda *args: _stream_chat_completion("openai", *args),
+    "openrouter": lambda *args: _stream_chat_completion("openrouter", *args),
+    "mock": mock_provider.stream,
+}
+configured_providers = {
+    "openai": bool(OPENAI_API_KEY),
+    "openrouter": bool(OPENROUTER_API_KEY),
+    "mock": MOCK_PROVIDER_ENABLED,
+}
+
+provider_router = ProviderRouter(
+    {name: call for name, call in provider_calls.items() if configured_providers[name]},
+    preference=[API_PROVIDER] + [name for name in ("openai", "openrouter", "mock") if name != API_PROVIDER],
+    failure_threshold=ROUTER_FAILURE_THRESHOLD,
+    cooldown=ROUTER_COOLDOWN,
+    hedge=HEDGE_REQUESTS,
+    hedge_min_delay=HEDGE_MIN_DELAY
+)
 
+folder_cache = TTLCache(maxsize=FOLDER_CACHE_SIZE, ttl=FOLDER_CACHE_TTL)
+
+drive_batcher = DriveBatcher(lambda: get_drive(), max_attempts=DRIVE_BATCH_MAX_ATTEMPTS)
+
+def drive_execute(operation: str, build_request):
+    """
+    Execute the Drive API request `build_request(client)` on a client checked out of the pool,
+    recording its latency and any error
+    """
+    started = time.perf_counter()
+    try:
+        with get_drive().client() as client:
+            result = build_request(client).execute()
+    except Exception as e:
+        DRIVE_SECONDS.labels(operation, "error").observe(time.perf_counter() - started)
+        record_error("drive", e)
+        raise
+    DRIVE_SECONDS.labels(operation, "ok").observe(time.perf_counter() - started)
+    return result
+
+def _folder_lookup(client, folder_name: str, parent_id: str):
+    query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and '{parent_id}' in parents and trashed=false"
+    return client.files().list(q=query, fields="files(id, name)", spaces="drive")
+
+def _folder_create(client, folder_name: str, parent_id: str):
+    metadata = {
+        "name": folder_name,
+        "mimeType": "application/vnd.google-apps.folder",
+        "parents": [parent_id]
+    }
+    return client.files().create(body=metadata, fields="id")
+
+def _find_or_create_folder(folder_name: str, parent_id: str) -> str:
+    """Drive lookup for a folder by name, creating it if missing"""
+    res = drive_execute("list", lambda client: _folder_lookup(client, folder_name, parent_id))
+    
+    if res.get("files"):
+        return res["files"][0]["id"]
+    
+    # Create if doesn't exist
+    folder = drive_execute("create_folder", lambda client: _folder_create(client, folder_name, parent_id))
+    return folder.get("id")
+
+def _batch_find_or_create_folders(keys: list) -> dict:
+    """(parent_id, name) -> folder id for `keys`: one batched lookup, then one batch of creates for the missing ones"""
+    lookups = drive_batcher.run([lambda client, key=key: _folder_lookup(client, key[1], key[0]) for key in keys])
+    found, missing = {}, []
+    for key, lookup in zip(keys, lookups):
+        if lookup["ok"] and lookup["result"].get("files"):
+            found[key] = lookup["result"]["files"][0]["id"]
+        elif lookup["ok"]:
+            missing.append(key)
+    
+    creates = drive_batcher.run([lambda client, key=key: _folder_create(client, key[1], key[0]) for key in missing])
+    for key, created in zip(missing, creates):
+        if created["ok"]:
+            found[key] = created["result"]["id"]
+    return found
+
+def prefetch_folders(folder_names: list, parent_id: str = DRIVE_FOLDER_ID):
+    """
+    Resolve many folders into the folder cache with batched Drive calls, single-flighted with
+    get_or_create_folder per folder; failures are left for get_or_create_folder to retry
+    """
+    names = [name for name in dict.fromkeys(folder_names) if folder_cache.get((parent_id, name)) is None]
+    if len(names) <= 1:
+        for name in names:
+            get_or_create_folder(name, parent_id)
+        return
+    folder_cache.get_or_load_many([(parent_id, name) for name in names], _batch_find_or_create_folders)
+
+@traced()
 def get_or_create_folder(folder_name: str, parent_id: str = DRIVE_FOLDER_ID) -> str:
-    """Get or create a folder in Google Drive"""
-    if not drive:
+    """Get or create a folder in Google Drive (cached; concurrent misses share one lookup)"""
+    if not get_drive():
         raise RuntimeError("Google Drive not initialized")
     
     try:
-        query = f"name='{folder_name}' and mimeType='application/vnd.google-apps.folder' and '{parent_id}' in parents and trashed=false"
-        res = drive.files().list(q=query, fields="files(id, name)", spaces="drive").execute()
-        
-        if res.get("files"):
-            return res["files"][0]["id"]
-        
-        # Create if doesn't exist
-        metadata = {
-            "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
-            "parents": [parent_id]
-        }
-        folder = drive.files().create(body=metadata, fields="id").execute()
-        return folder.get("id")
+        return folder_cache.get_or_load(
+            (parent_id, folder_name),
+            lambda: _find_or_create_folder(folder_name, parent_id)
+        )
     
     except Exception as e:
         raise RuntimeError(f"Folder operation failed: {str(e)}")
 
-def save_chapter_to_drive(project_name: str, chapter_title: str, content: str, chapter_num: int = None) -> dict:
-    """Save story chapter to Google Drive"""
-    if not drive:
+def drive_upload_session():
+    """Authorized HTTP session for resumable uploads (one per upload thread)"""
+    from google.auth.transport.requests import AuthorizedSession
+    return AuthorizedSession(drive_credentials)
+
+resumable_uploader = ResumableUploader(drive_upload_session, DRIVE_UPLOAD_URL, DRIVE_UPLOAD_CHUNK_SIZE)
+
+@traced()
+def save_chapter_to_drive(project_name: str, chapter_title: str, content, chapter_num: int = None,
+                          session: dict = None, checkpoint=None) -> dict:
+    """
+    Save story chapter to Google Drive. `content` is the text or a file holding it; files of
+    DRIVE_RESUMABLE_MIN_BYTES or more are streamed in resumable chunks, with the session kept
+    in `session` (persisted by the caller through `checkpoint()`) so a retry resumes it.
+    """
+    if not get_drive():
         raise RuntimeError("Google Drive not initialized")
+    from googleapiclient.http import MediaIoBaseUpload
+    from googleapiclient.errors import HttpError
     
     try:
-        # Get or create project folder
-        project_folder_id = get_or_create_folder(project_name)
-        
         # Create filename
         if chapter_num:
             filename = f"Chapter_{chapter_num}_{chapter_title}.txt"
         else:
             filename = f"{chapter_title}.txt"
         
-        # Create file in Drive
-        file_metadata = {
-            "name": filename,
-            "parents": [project_folder_id]
-        }
+        def upload(folder_id: str) -> dict:
+            metadata = {"name": filename, "parents": [folder_id]}
+            if isinstance(content, Path) and drive_credentials and content.stat().st_size >= DRIVE_RESUMABLE_MIN_BYTES:
+                return resumable_uploader.upload(content, metadata, "text/plain", session if session is not None else {}, checkpoint)
+            data = content.read_bytes() if isinstance(content, Path) else content.encode('utf-8')
+            file = drive_execute("upload", lambda client: client.files().create(
+                body=metadata,
+                media_body=MediaIoBaseUpload(BytesIO(data), mimetype='text/plain'),
+                fields='id, webViewLink'
+            ))
+            DRIVE_UPLOAD_BYTES.labels("simple").inc(len(data))
+            return file
         
-        file = drive.files().create(
-            body=file_metadata,
-            media_body=MediaIoBaseUpload(
-                BytesIO(content.encode('utf-8')),
-                mimetype='text/plain'
-            ),
-            fields='id, webViewLink'
-        ).execute()
+        # Get or create project folder
+        project_folder_id = get_or_create_folder(project_name)
+        
+        try:
+            file = upload(project_folder_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # Cached folder id is stale (folder deleted in Drive) - look it up again
+            folder_cache.invalidate((DRIVE_FOLDER_ID, project_name))
+            file = upload(get_or_create_folder(project_name))
         
         return {
             "file_id": file.get("id"),
@@ -351,23 +844,130 @@ def save_chapter_to_drive(project_name: str, chapter_title: str, content: str, c
     except Exception as e:
         raise RuntimeError(f"Save failed: {str(e)}")
 
+story_index = StoryIndex(DATA_DIR / "stories.db")
+
+upload_pipeline = UploadPipeline(
+    DATA_DIR / "uploads",
+    save_chapter_to_drive,
+    workers=UPLOAD_WORKERS,
+    max_attempts=UPLOAD_MAX_ATTEMPTS,
+    on_done=story_index.record_upload
+)
+
+def sync_story_index():
+    """Copy Drive results the index missed (uploads that finished while the process was down)"""
+    for upload_id in story_index.pending_uploads():
+        upload = upload_pipeline.get(upload_id)
+        if upload and upload["status"] != "pending":
+            story_index.record_upload(upload)
+
+def drive_fields(upload: dict) -> dict:
+    """Drive status fields for a staged upload record"""
+    drive_info = upload.get("drive") or {}
+    return {
+        "drive_status": upload["status"],
+        "upload_id": upload["id"],
+        "drive_link": drive_info.get("link"),
+        "file_id": drive_info.get("file_id"),
+    }
+
 # ========================================
-# ISABELLA STORY ENDPOINTS
+# STORY MEMORY
 # ========================================
 
-@app.post("/story/create")
-async def create_story(request: StoryPrompt):
+story_memory = StoryMemory(
+    DATA_DIR / "memory",
+    lambda prompt, max_tokens: call_writer_model_async(
+        prompt, MEMORY_MODEL, system_instruction=MEMORY_SYSTEM, max_tokens=max_tokens, priority=PRIORITY_BATCH
+    )
+)
+
+def chapter_reader(project: str, number: int):
+    """Reads a saved chapter back from the index when a queued memory update gets to it"""
+    return lambda: story_index.chapter_text(project, number)
+
+def save_new_story(request: StoryPrompt, content) -> dict:
     """
-    Isabella writes a new story from a single prompt.
-    Automatically saves to Google Drive.
-    Returns: chapter content + Google Drive link
+    Index chapter 1, stage it for Drive and start the story memory from it; returns the
+    upload record, whose project_name is the key the story went under (a new prompt in a
+    project that already has a story goes under "name (2)", ...). A retried create gets
+    the upload of the chapter it already made. An overwritten chapter 1 keeps the memory
+    of the later chapters, if there are any.
     """
-    if not drive:
-        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
-    
-    try:
-        # Build writing prompt
-        writing_prompt = f"""
+    chapter_title = request.prompt[:50].replace(" ", "_")
+    chapter = story_index.start_project(
+        request.project_name, request.prompt, request.genre, chapter_title, content, replace=request.overwrite
+    )
+    project = chapter["project"]
+    if chapter.get("existing"):
+        return story_upload(chapter)
+    upload = upload_pipeline.stage(project, chapter_title, content, chapter_num=1)
+    story_index.link_upload(project, 1, upload)
+    if not chapter["replaced"] or story_index.project(project)["chapters"] == 1:
+        story_memory.start(project, request.prompt, request.genre, chapter_reader(project, 1))
+    return upload
+
+def existing_story(request: StoryPrompt) -> dict:
+    """Chapter 1 already created from this request's prompt (the request is a retry), or None"""
+    return None if request.overwrite else story_index.existing_story(request.project_name, request.prompt)
+
+def story_upload(chapter: dict) -> dict:
+    """The upload record of an indexed chapter, staged again if it never got one"""
+    upload = upload_pipeline.get(chapter["upload_id"]) if chapter["upload_id"] else None
+    if upload is None:
+        text = story_index.chapter_text(chapter["project"], chapter["number"])
+        upload = upload_pipeline.stage(chapter["project"], chapter["title"], text, chapter_num=chapter["number"])
+        story_index.link_upload(chapter["project"], chapter["number"], upload)
+    return upload
+
+def save_continuation(request: ContinueStory, content) -> dict:
+    """Index the next chapter (numbered atomically), stage it for Drive and fold it into the story memory"""
+    chapter = story_index.append_chapter(request.project_name, "continuation", content)
+    upload = upload_pipeline.stage(request.project_name, "continuation", content, chapter_num=chapter["number"])
+    story_index.link_upload(request.project_name, chapter["number"], upload)
+    if not chapter.get("deduplicated"):
+        story_memory.add_chapter(request.project_name, chapter_reader(request.project_name, chapter["number"]))
+    return upload
+
+def save_revision(request: ReviseChapter, content, mode: str = "full") -> dict:
+    """Store the revised chapter as a new revision (with its diff) and stage it for Drive"""
+    story_index.revise_chapter(request.project_name, request.chapter_num, content, mode, request.feedback)
+    upload = upload_pipeline.stage(
+        request.project_name, f"Chapter_{request.chapter_num}_REVISED", content, chapter_num=request.chapter_num
+    )
+    story_index.link_upload(request.project_name, request.chapter_num, upload)
+    return upload
+
+def chapter_not_found(request: ReviseChapter) -> JSONResponse:
+    return JSONResponse(
+        status_code=404,
+        content={"error": f"Chapter {request.chapter_num} of project '{request.project_name}' not found"}
+    )
+
+class MissingStoryContext(ValueError):
+    """No story memory for the project and no context in the request"""
+
+def continue_prompt_for(request: ContinueStory) -> str:
+    # The memory update for the previous chapter may still be queued at batch priority;
+    # rather than wait behind it, catch its snapshot up from the chapters in the index
+    memory = story_memory.snapshot(
+        request.project_name, story_index.project(request.project_name),
+        lambda number: story_index.chapter_text(request.project_name, number),
+    )
+    if memory is None and not request.context:
+        raise MissingStoryContext(
+            f"No story memory for project '{request.project_name}' - create the story first or send a context recap"
+        )
+    return build_continue_prompt(request, memory)
+
+# ========================================
+# PROMPT BUILDERS
+# ========================================
+
+@traced()
+def build_create_prompt(request: StoryPrompt) -> str:
+    """Writing prompt for the opening chapter of a new story"""
+    return f"""
 STORY PROMPT: {request.prompt}
 
 REQUIREMENTS:
@@ -380,30 +980,106 @@ REQUIREMENTS:
 
 WRITE THE COMPLETE OPENING CHAPTER NOW:
 """
+
+@traced()
+def build_continue_prompt(request: ContinueStory, memory: dict = None) -> str:
+    """Writing prompt for the next chapter, built from the project's story memory (and/or the client's context)"""
+    sections = []
+    if memory:
+        sections.append(render_memory(memory))
+    if request.context:
+        sections.append(f"DIRECTION FOR THIS CHAPTER: {request.context}" if memory else f"STORY CONTEXT: {request.context}")
+    story = "\n\n".join(sections)
+    chapter = f"CHAPTER {memory['chapters'] + 1}" if memory else "THE NEXT CHAPTER"
+    return f"""
+{story}
+
+WRITE {chapter}:
+- Continue from the emotional and narrative momentum established
+- Escalate stakes, complexity, and character revelation
+- Maintain established voice and thematic consistency
+- Target length: 3000-4000 words
+- Open strong, close with cliffhanger or emotional beat
+- NO summaries, NO recaps—reader already knows what happened
+
+WRITE CHAPTER NOW:
+"""
+
+@traced()
+def build_revise_prompt(request: ReviseChapter, original: str) -> str:
+    """Writing prompt for a feedback-driven chapter rewrite"""
+    return f"""
+CHAPTER TO REVISE: Chapter {request.chapter_num}
+
+{original}
+
+REVISION NOTES: {request.feedback}
+
+INSTRUCTIONS:
+- Identify the root cause of the feedback (not just surface symptoms)
+- Rewrite the entire chapter with the correction integrated
+- Maintain character consistency and plot continuity
+- Keep any elements that work; transform what doesn't
+- Preserve the chapter's emotional arc
+- Length: original length ({count_words(original)} words)
+
+WRITE THE REVISED CHAPTER NOW:
+"""
+
+# ========================================
+# ISABELLA STORY ENDPOINTS
+# ========================================
+
+def story_created(request: StoryPrompt, story_content: str, upload: dict) -> dict:
+    return {
+        "status": "success",
+        "message": "Story chapter created and queued for Google Drive",
+        "chapter": 1,
+        "word_count": count_words(story_content),
+        "project": upload["project_name"],
+        **drive_fields(upload),
+        "preview": story_content[:500] + "..."
+    }
+
+@app.post("/story/create")
+async def create_story(request: StoryPrompt):
+    """
+    Isabella writes a new story from a single prompt.
+    Automatically saves to Google Drive.
+    Returns: chapter content + Google Drive link
+    """
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    
+    try:
+        # A retry of a create that already went through gets the chapter it made
+        existing = existing_story(request)
+        if existing is not None:
+            story_content = story_index.chapter_text(existing["project"], 1)
+            return story_created(request, story_content, story_upload(existing))
         
-        # Generate story
-        story_content = await call_writer_model_async(writing_prompt, request.model)
+        # Build writing prompt
+        writing_prompt = build_create_prompt(request)
         
-        # Save to Drive
-        chapter_title = request.prompt[:50].replace(" ", "_")
-        drive_info = save_chapter_to_drive(
-            request.project_name,
-            chapter_title,
-            story_content,
-            chapter_num=1
-        )
+        # Generate story (long chapters: outline, then scenes in parallel)
+        if request.length == "long" and LONG_CHAPTER_SCENES > 1:
+            story_content = await generate_long_chapter(
+                request.prompt,
+                request.genre,
+                lambda prompt, max_tokens, system: call_writer_model_async(
+                    prompt, request.model, system_instruction=system, max_tokens=max_tokens, length="long"
+                ),
+                scenes=LONG_CHAPTER_SCENES
+            )
+        else:
+            story_content = await call_writer_model_async(writing_prompt, request.model, cache=request.cache, length=request.length)
         
-        return {
-            "status": "success",
-            "message": "Story chapter created and saved to Google Drive",
-            "chapter": 1,
-            "word_count": len(story_content.split()),
-            "project": request.project_name,
-            "drive_link": drive_info["link"],
-            "file_id": drive_info["file_id"],
-            "preview": story_content[:500] + "..."
-        }
+        # Stage for Drive (uploaded in the background) and start the story memory
+        upload = save_new_story(request, story_content)
+        return story_created(request, story_content, upload)
     
+    except (GenerationQueueFull, ProviderRateLimited) as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -414,44 +1090,32 @@ async def continue_story(request: ContinueStory):
     Analyzes previous chapter and escalates naturally.
     Saves next chapter to Google Drive.
     """
-    if not drive:
+    if not await drive_available():
         return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
     
     try:
-        continuation_prompt = f"""
-STORY CONTEXT: {request.context}
-
-WRITE THE NEXT CHAPTER:
-- Continue from the emotional and narrative momentum established
-- Escalate stakes, complexity, and character revelation
-- Maintain established voice and thematic consistency
-- Target length: 3000-4000 words
-- Open strong, close with cliffhanger or emotional beat
-- NO summaries, NO recaps—reader already knows what happened
-
-WRITE CHAPTER NOW:
-"""
+        next_prompt = continue_prompt_for(request)
         
         # Generate continuation
-        next_chapter = await call_writer_model_async(continuation_prompt, request.model)
+        next_chapter = await call_writer_model_async(next_prompt, request.model, priority=PRIORITY_INTERACTIVE)
         
-        # Save to Drive
-        drive_info = save_chapter_to_drive(
-            request.project_name,
-            "continuation",
-            next_chapter,
-            chapter_num=None
-        )
+        # Index, stage for Drive (uploaded in the background) and update the story memory
+        upload = save_continuation(request, next_chapter)
         
         return {
             "status": "success",
-            "message": "Story continued and saved to Google Drive",
-            "word_count": len(next_chapter.split()),
+            "message": "Story continued and queued for Google Drive",
+            "chapter": upload["chapter_num"],
+            "word_count": count_words(next_chapter),
             "project": request.project_name,
-            "drive_link": drive_info["link"],
+            **drive_fields(upload),
             "preview": next_chapter[:500] + "..."
         }
     
+    except MissingStoryContext as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except (GenerationQueueFull, ProviderRateLimited) as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -461,52 +1125,533 @@ async def revise_chapter(request: ReviseChapter):
     Isabella rewrites a chapter based on feedback.
     Fixes structural issues, not just surface changes.
     """
-    if not drive:
+    if not await drive_available():
         return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
     
+    original = story_index.chapter_text(request.project_name, request.chapter_num)
+    if original is None:
+        return chapter_not_found(request)
+    if request.mode not in ("auto", "partial", "full"):
+        return JSONResponse(status_code=400, content={"error": "mode must be auto, partial or full"})
+    
     try:
-        revision_prompt = f"""
-CHAPTER TO REVISE: Chapter {request.chapter_num}
-
-REVISION NOTES: {request.feedback}
-
-INSTRUCTIONS:
-- Identify the root cause of the feedback (not just surface symptoms)
-- Rewrite the entire chapter with the correction integrated
-- Maintain character consistency and plot continuity
-- Keep any elements that work; transform what doesn't
-- Preserve the chapter's emotional arc
-- Length: original length (3000-4000 words)
-
-WRITE THE REVISED CHAPTER NOW:
-"""
-        
-        # Generate revision
-        revised_chapter = await call_writer_model_async(revision_prompt, request.model)
+        # Targeted revision: rewrite only the paragraphs the feedback is about
+        spans = await revision_spans(request, original) if request.mode != "full" else None
+        if spans:
+            paragraphs = split_paragraphs(original)
+            revised_chapter = "\n\n".join(await revise_spans(
+                paragraphs, spans, request.feedback, request.chapter_num,
+                lambda prompt, max_tokens, system: call_writer_model_async(
+                    prompt, request.model, system_instruction=system, max_tokens=max_tokens
+                )
+            ))
+            mode = "partial"
+        else:
+            revised_chapter = await call_writer_model_async(
+                build_revise_prompt(request, original), request.model, length=length_for_words(count_words(original))
+            )
+            mode = "full"
         
-        # Save revised version
-        drive_info = save_chapter_to_drive(
-            request.project_name,
-            f"Chapter_{request.chapter_num}_REVISED",
-            revised_chapter,
-            chapter_num=request.chapter_num
-        )
+        # Store as a new revision (with diff) and stage revised version for Drive (uploaded in the background)
+        upload = save_revision(request, revised_chapter, mode)
+        revision = story_index.revisions(request.project_name, request.chapter_num)[0]
         
         return {
             "status": "success",
-            "message": f"Chapter {request.chapter_num} revised and saved",
+            "message": f"Chapter {request.chapter_num} revised and queued for Google Drive",
             "project": request.project_name,
-            "drive_link": drive_info["link"],
+            "mode": mode,
+            "revised_paragraphs": [[start + 1, end] for start, end in spans or []],
+            "revision": revision["revision"],
+            "diff": diff_stats(revision["diff"]),
+            **drive_fields(upload),
             "preview": revised_chapter[:500] + "..."
         }
     
+    except (GenerationQueueFull, ProviderRateLimited) as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+async def revision_spans(request: ReviseChapter, original: str) -> list:
+    """
+    Paragraph spans to rewrite for a partial revision, or None for a full rewrite.
+    Explicit `paragraphs` win; otherwise a short model call locates them.
+    """
+    paragraphs = split_paragraphs(original)
+    if request.paragraphs:
+        return merge_spans([n - 1 for n in request.paragraphs], len(paragraphs)) or None
+    spans = await locate_spans(
+        paragraphs, request.feedback,
+        lambda prompt, max_tokens, system: call_writer_model_async(
+            prompt, request.model, system_instruction=system, max_tokens=max_tokens
+        )
+    )
+    if spans is None and request.mode == "partial":
+        print(f"WARNING: Could not narrow revision of {request.project_name} chapter {request.chapter_num}, rewriting it in full")
+    return spans
+
+# ========================================
+# STREAMING (SERVER-SENT EVENTS)
+# ========================================
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_story(prompt: str, model: str, save, result: dict, cache: bool = False, priority: int = PRIORITY_NORMAL,
+                       length: str = "chapter"):
+    """
+    Forward provider tokens as `token` events while spooling them into the chapter's staging
+    file, stage that file for Drive, then emit a `done` event once it is uploaded (or an
+    `error` event). A generation-cache hit is sent as a single `token` event.
+    """
+    spool = upload_pipeline.spool()
+    try:
+        key = generation_cache_key(prompt, model, length) if cache else None
+        cached = generation_cache.get(key) if key else None
+        if cached is not None:
+            spool.write(cached)
+            yield sse_event("token", {"text": cached})
+        else:
+            async with generation_scheduler.slot(priority):
+                async for delta in stream_writer_model(prompt, model, length=length):
+                    spool.write(delta)
+                    yield sse_event("token", {"text": delta})
+        
+        if key and cached is None:
+            generation_cache.put(key, spool.read_text())
+        upload = await upload_pipeline.wait(save(spool)["id"])
+        yield sse_event("done", {
+            "status": "success",
+            "chapter": upload["chapter_num"],
+            **result,
+            "project": upload["project_name"],
+            "word_count": spool.words,
+            **drive_fields(upload),
+        })
+    
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+    finally:
+        spool.discard()
+
+async def replay_story(chapter: dict, result: dict):
+    """stream_story for a chapter that is already saved: its text as a single `token` event, then `done`"""
+    try:
+        yield sse_event("token", {"text": story_index.chapter_text(chapter["project"], chapter["number"])})
+        upload = await upload_pipeline.wait(story_upload(chapter)["id"])
+        yield sse_event("done", {
+            "status": "success",
+            "chapter": chapter["number"],
+            **result,
+            "project": chapter["project"],
+            "word_count": chapter["word_count"],
+            **drive_fields(upload),
+        })
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+
+def sse_response(events) -> StreamingResponse:
+    """Wrap an SSE generator, disabling proxy buffering so tokens flush immediately"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/story/create/stream")
+async def create_story_stream(request: StoryPrompt):
+    """Streaming variant of /story/create - tokens arrive as SSE, final event carries the Drive link"""
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    result = {"message": "Story chapter created and saved to Google Drive", "chapter": 1, "project": request.project_name}
+    existing = existing_story(request)
+    if existing is not None:
+        return sse_response(replay_story(existing, result))
+    try:
+        generation_scheduler.check_admission()
+    except GenerationQueueFull as e:
+        return busy_response(e)
+    
+    return sse_response(stream_story(
+        build_create_prompt(request),
+        request.model,
+        lambda content: save_new_story(request, content),
+        result,
+        cache=request.cache,
+        length=request.length
+    ))
+
+@app.post("/story/continue/stream")
+async def continue_story_stream(request: ContinueStory):
+    """Streaming variant of /story/continue"""
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    try:
+        generation_scheduler.check_admission()
+    except GenerationQueueFull as e:
+        return busy_response(e)
+    
+    try:
+        next_prompt = continue_prompt_for(request)
+    except MissingStoryContext as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    
+    return sse_response(stream_story(
+        next_prompt,
+        request.model,
+        lambda content: save_continuation(request, content),
+        {"message": "Story continued and saved to Google Drive", "project": request.project_name},
+        priority=PRIORITY_INTERACTIVE
+    ))
+
+@app.post("/story/revise/stream")
+async def revise_chapter_stream(request: ReviseChapter):
+    """Streaming variant of /story/revise (always a full rewrite; `mode` and `paragraphs` are ignored)"""
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    try:
+        generation_scheduler.check_admission()
+    except GenerationQueueFull as e:
+        return busy_response(e)
+    
+    original = story_index.chapter_text(request.project_name, request.chapter_num)
+    if original is None:
+        return chapter_not_found(request)
+    
+    return sse_response(stream_story(
+        build_revise_prompt(request, original),
+        request.model,
+        lambda content: save_revision(request, content),
+        {"message": f"Chapter {request.chapter_num} revised and saved", "project": request.project_name},
+        length=length_for_words(count_words(original))
+    ))
+
+# ========================================
+# BACKGROUND JOBS
+# ========================================
+
+class JobRequest(BaseModel):
+    kind: str  # create, continue or revise
+    request: dict  # same body the matching /story/* endpoint takes
+
+JOB_KINDS = {
+    "create": (StoryPrompt, create_story),
+    "continue": (ContinueStory, continue_story),
+    "revise": (ReviseChapter, revise_chapter),
+}
+
+async def run_story_handler(handler, request, progress=lambda message: None) -> dict:
+    """Call a story endpoint function directly, waiting out 429s; any other error response raises"""
+    while True:
+        progress("generating")
+        response = await handler(request)
+        if not isinstance(response, JSONResponse):
+            return response
+        body = json.loads(response.body)
+        if response.status_code == 429:
+            progress(f"waiting for a generation slot (retry in {body['retry_after']}s)")
+            await asyncio.sleep(body["retry_after"])
+            continue
+        raise RuntimeError(body.get("error", f"HTTP {response.status_code}"))
+
+def _story_job(model_cls, handler):
+    """Run a story endpoint as a job body and wait for its Drive upload"""
+    async def run(payload: dict, progress) -> dict:
+        floor = priority_floor.set(PRIORITY_BATCH)  # background work yields to interactive requests
+        try:
+            response = await run_story_handler(handler, model_cls(**payload), progress)
+        finally:
+            priority_floor.reset(floor)
+        if response.get("drive_status") == "pending":
+            progress("saving to Google Drive")
+            response.update(drive_fields(await upload_pipeline.wait(response["upload_id"])))
+        return response
+    return run
+
+job_runner = JobRunner(
+    JobStore(DATA_DIR / "jobs.db"),
+    {kind: _story_job(model_cls, handler) for kind, (model_cls, handler) in JOB_KINDS.items()},
+    workers=JOB_WORKERS
+)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Queue a story generation and return its job id immediately"""
+    if request.kind not in JOB_KINDS:
+        return JSONResponse(status_code=400, content={"error": f"Unknown job kind '{request.kind}' (expected one of: {', '.join(JOB_KINDS)})"})
+    try:
+        JOB_KINDS[request.kind][0](**request.request)
+    except ValidationError as e:
+        return JSONResponse(status_code=422, content={"error": "Invalid job request", "detail": e.errors()})
+    
+    return job_runner.submit(request.kind, request.request)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a job's status, progress and result"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job {job_id} not found"})
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Subscribe to a job as Server-Sent Events until it succeeds or fails"""
+    if job_runner.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"error": f"Job {job_id} not found"})
+    
+    async def events():
+        async for job in job_runner.subscribe(job_id):
+            yield sse_event("job", job)
+    
+    return sse_response(events())
+
+# ========================================
+# BATCH GENERATION
+# ========================================
+
+class StoryBatch(BaseModel):
+    items: List[StoryPrompt]
+
+async def _prefetch_folders(project_names: list):
+    """Warm the folder cache for the batch's projects; failures are left for the uploads to retry"""
+    try:
+        await upload_pipeline.call(prefetch_folders, project_names)
+    except Exception as e:
+        record_error("drive", e)
+        print(f"WARNING: Folder prefetch failed: {str(e)}")
+
+@app.post("/story/batch")
+async def create_story_batch(request: StoryBatch):
+    """
+    Generate many stories concurrently. Results stream back as NDJSON, one line per item
+    as it finishes (with its `index`), followed by a summary line. An item repeating an
+    earlier one (same project and prompt, or a second overwrite of the same project) fails
+    without generating; an item whose story already exists is answered from the index.
+    """
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    if not request.items or len(request.items) > BATCH_MAX_ITEMS:
+        return JSONResponse(status_code=400, content={"error": f"A batch needs 1-{BATCH_MAX_ITEMS} items"})
+    
+    # Checked for every item before fanning out, so no generation is spent on a repeat
+    first_of = {}
+    duplicates = {}
+    for index, item in enumerate(request.items):
+        key = (item.project_name, None if item.overwrite else item.prompt)
+        if key in first_of:
+            duplicates[index] = first_of[key]
+        else:
+            first_of[key] = index
+    existing = {index for index, item in enumerate(request.items) if index not in duplicates and existing_story(item)}
+    
+    # Resolve the project folders (batched), in parallel with generation, so uploads skip the lookup
+    run_in_background(_prefetch_folders([item.project_name for item in request.items]))
+    
+    # Leave headroom in the shared queue for interactive requests
+    limit = asyncio.Semaphore(max(1, GENERATION_MAX_CONCURRENCY // 2))
+    
+    async def run_item(index: int, item: StoryPrompt) -> dict:
+        priority_floor.set(PRIORITY_BATCH)  # each item runs in its own task/context
+        if index in duplicates:
+            return {"index": index, "status": "error", "error": f"Duplicate of item {duplicates[index]}"}
+        if index in existing:  # answered from the index, no generation slot needed
+            return await create_item(index, item)
+        async with limit:
+            return await create_item(index, item)
+    
+    async def create_item(index: int, item: StoryPrompt) -> dict:
+        try:
+            return {"index": index, **await run_story_handler(create_story, item)}
+        except Exception as e:
+            return {"index": index, "status": "error", "error": str(e)}
+    
+    async def results():
+        succeeded = 0
+        for finished in asyncio.as_completed([run_item(i, item) for i, item in enumerate(request.items)]):
+            result = await finished
+            succeeded += result["status"] == "success"
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "succeeded": succeeded, "failed": len(request.items) - succeeded}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# ========================================
+# DRIVE UPLOADS
+# ========================================
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Check whether a staged chapter has reached Google Drive"""
+    upload = upload_pipeline.get(upload_id)
+    if upload is None:
+        return JSONResponse(status_code=404, content={"error": f"Upload {upload_id} not found"})
+    return {**drive_fields(upload), "attempts": upload["attempts"], "error": upload["error"]}
+
+# ========================================
+# DRIVE BULK OPERATIONS
+# ========================================
+
+class DriveOperation(BaseModel):
+    op: str  # metadata, rename, move, copy, trash, untrash, delete
+    file_id: Optional[str] = None  # omitted: apply to every file in the project folder
+    name: Optional[str] = None  # new name for rename / copy
+    folder_id: Optional[str] = None  # destination folder for move / copy
+
+class DriveBulk(BaseModel):
+    operations: List[DriveOperation]
+    project_name: Optional[str] = None  # project folder for operations without a file_id
+
+def list_folder_files(folder_id: str) -> list:
+    """Every (non-trashed) file directly in a Drive folder, 1000 per list call"""
+    files, page_token = [], None
+    while True:
+        res = drive_execute("list", lambda client: client.files().list(
+            q=f"'{folder_id}' in parents and trashed=false", spaces="drive", pageSize=1000,
+            fields="nextPageToken, files(id, name, parents)", pageToken=page_token
+        ))
+        files.extend(res.get("files", []))
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            return files
+
+def run_drive_bulk(request: DriveBulk) -> dict:
+    """Expand project-wide operations, look up parents for moves, then run everything in batches"""
+    batches_before = drive_batcher.batches
+    operations, parents, folder_files = [], {}, None
+    for operation in request.operations:
+        if operation.file_id:
+            operations.append(operation.dict())
+            continue
+        if folder_files is None:
+            folder_files = list_folder_files(get_or_create_folder(request.project_name))
+            parents.update({file["id"]: file.get("parents", []) for file in folder_files})
+        operations.extend(dict(operation.dict(), file_id=file["id"]) for file in folder_files)
+    if len(operations) > DRIVE_BULK_MAX_OPERATIONS:
+        raise ValueError(f"{len(operations)} operations exceed the limit of {DRIVE_BULK_MAX_OPERATIONS}")
+    
+    # A move has to name the parents it removes
+    unknown = list(dict.fromkeys(op["file_id"] for op in operations if op["op"] == "move" and op["file_id"] not in parents))
+    lookups = drive_batcher.run([
+        lambda client, file_id=file_id: client.files().get(fileId=file_id, fields="id, parents") for file_id in unknown
+    ])
+    parents.update({file_id: lookup["result"].get("parents", []) for file_id, lookup in zip(unknown, lookups) if lookup["ok"]})
+    for op in operations:
+        op["parents"] = parents.get(op["file_id"])
+    
+    results = drive_batcher.run([lambda client, op=op: operation_request(client, op) for op in operations])
+    succeeded = sum(1 for result in results if result["ok"])
+    return {
+        "status": "success" if succeeded == len(results) else ("partial" if succeeded else "failed"),
+        "operations": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "batch_requests": drive_batcher.batches - batches_before,
+        "results": [
+            {"op": op["op"], "file_id": op["file_id"], **result} for op, result in zip(operations, results)
+        ]
+    }
+
+@app.post("/drive/bulk")
+async def drive_bulk(request: DriveBulk):
+    """
+    Run many Drive file operations through Drive batch requests (up to 100 calls per HTTP
+    request), with per-operation results. Operations without a file_id apply to every
+    file in `project_name`'s folder; transient per-call failures are retried.
+    """
+    if not await drive_available():
+        return JSONResponse(status_code=500, content={"error": "Google Drive not initialized"})
+    for operation in request.operations:
+        if operation.op not in BULK_OPERATIONS:
+            return JSONResponse(status_code=400, content={"error": f"Unknown operation '{operation.op}' (use {', '.join(BULK_OPERATIONS)})"})
+        if operation.op == "rename" and not operation.name:
+            return JSONResponse(status_code=400, content={"error": "rename needs a name"})
+        if operation.op == "move" and not operation.folder_id:
+            return JSONResponse(status_code=400, content={"error": "move needs a folder_id"})
+        if not operation.file_id and not request.project_name:
+            return JSONResponse(status_code=400, content={"error": "Operations without a file_id need a project_name"})
+    if not request.operations or len(request.operations) > DRIVE_BULK_MAX_OPERATIONS:
+        return JSONResponse(status_code=400, content={"error": f"Send 1-{DRIVE_BULK_MAX_OPERATIONS} operations"})
+    
+    try:
+        return await upload_pipeline.call(run_drive_bulk, request)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+# ========================================
+# MANUSCRIPT EXPORT
+# ========================================
+
+manuscript_exporter = ManuscriptExporter(
+    DATA_DIR / "exports",
+    story_index.chapter_texts,
+    read_ahead=EXPORT_READ_AHEAD,
+    max_entries=EXPORT_CACHE_ENTRIES
+)
+
+@app.get("/story/{project_name}/export")
+async def export_project(project_name: str, format: str = "md"):
+    """
+    The whole project as one md, txt or epub document, streamed in chapter order while later
+    chapters are still being read; unchanged projects are served from the export cache
+    """
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(status_code=400, content={"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"})
+    project = story_index.project(project_name)
+    chapters = story_index.chapters(project_name)
+    if project is None or not chapters:
+        return JSONResponse(status_code=404, content={"error": "Project not found"})
+    
+    filename = f"{re.sub(r'[^A-Za-z0-9_-]+', '_', project_name).strip('_') or 'manuscript'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    cached = manuscript_exporter.cached(project, chapters, format)
+    if cached is not None:
+        return FileResponse(cached, media_type=EXPORT_FORMATS[format], headers={**headers, "X-Export-Cache": "hit"})
+    return StreamingResponse(
+        manuscript_exporter.stream(project, chapters, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={**headers, "X-Export-Cache": "miss"}
+    )
+
 # ========================================
 # UTILITY ENDPOINTS
 # ========================================
 
+@app.get("/story/{project_name}/chapters")
+async def project_chapters(project_name: str):
+    """Project summary and its chapters (numbers, word counts, revisions, Drive links) from the local index"""
+    project = story_index.project(project_name)
+    if project is None:
+        return JSONResponse(status_code=404, content={"error": "Project not found"})
+    return {**project, "chapter_list": story_index.chapters(project_name)}
+
+@app.get("/story/{project_name}/chapters/{chapter_num}")
+async def project_chapter(project_name: str, chapter_num: int):
+    """One indexed chapter, including its text"""
+    chapter = story_index.chapter(project_name, chapter_num, with_text=True)
+    if chapter is None:
+        return JSONResponse(status_code=404, content={"error": "Chapter not found"})
+    return chapter
+
+@app.get("/story/{project_name}/chapters/{chapter_num}/revisions")
+async def chapter_revisions(project_name: str, chapter_num: int):
+    """Revision history of a chapter: mode, feedback and paragraph-level diff per revision"""
+    if story_index.chapter(project_name, chapter_num) is None:
+        return JSONResponse(status_code=404, content={"error": "Chapter not found"})
+    return {"project": project_name, "chapter": chapter_num, "revisions": story_index.revisions(project_name, chapter_num)}
+
+@app.get("/story/{project_name}/memory")
+async def project_memory(project_name: str):
+    """Rolling story memory (premise, arc, recent chapters, characters, threads, style) for a project"""
+    memory = await story_memory.get(project_name)
+    if memory is None:
+        return JSONResponse(status_code=404, content={"error": "No story memory for this project"})
+    return memory
+
 @app.get("/story/models")
 async def available_models():
     """List available writing models and their characteristics"""
@@ -521,6 +1666,15 @@ async def available_models():
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request, queue, provider, token, Drive and event-loop latency plus error counters"""
+    stats = generation_scheduler.stats()
+    QUEUE_DEPTH.labels("running").set(stats["active"])
+    QUEUE_DEPTH.labels("queued").set(stats["queued"])
+    UPLOAD_PENDING.set(upload_pipeline.stats()["pending"])
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/story/status")
 async def status():
     """Check system status and API connections"""
@@ -528,10 +1682,26 @@ async def status():
         "service": "Isabella Master Storyteller",
         "version": "5.0.0",
         "status": "online",
-        "google_drive": "connected" if drive else "disconnected",
+        "google_drive": "connected" if drive else ("disconnected" if drive_init["done"] else "initializing"),
+        "startup": {**startup_timings, "drive_init_seconds": drive_init["seconds"]},
         "api_provider": API_PROVIDER,
         "openai": "configured" if OPENAI_API_KEY else "missing",
         "openrouter": "configured" if OPENROUTER_API_KEY else "missing",
+        "routing": provider_router.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "budgets": budget_tracker.stats(),
+        "story_memory": story_memory.stats(),
+        "story_index": story_index.stats(),
+        "tracing": tracer.stats(),
+        "generation_queue": generation_scheduler.stats(),
+        "drive_pool": drive.stats() if drive else None,
+        "drive_batches": drive_batcher.stats(),
+        "resumable_uploads": resumable_uploader.stats(),
+        "exports": manuscript_exporter.stats(),
+        "folder_cache": folder_cache.stats(),
+        "uploads": upload_pipeline.stats(),
+        "generation_cache": generation_cache.stats() if GENERATION_CACHE_ENABLED else "disabled",
+        "coalescing": {**coalescing_stats, "in_flight": len(_inflight_generations)},
         "timestamp": datetime.now().isoformat()
     }
 
@@ -539,11 +1709,70 @@ async def status():
 # HELPER ASYNC WRAPPER
 # ========================================
 
-async def call_writer_model_async(prompt: str, model: str) -> str:
-    """Async wrapper for writer model call - runs in thread pool to avoid blocking"""
-    loop = asyncio.get_event_loop()
-    executor = ThreadPoolExecutor(max_workers=1)
-    return await loop.run_in_executor(executor, lambda: call_writer_model(prompt, model))
+generation_cache = GenerationCache(
+    DATA_DIR / "gen_cache",
+    ttl=GENERATION_CACHE_TTL,
+    memory_entries=GENERATION_CACHE_MEMORY_ENTRIES,
+    disk_max_entries=GENERATION_CACHE_DISK_ENTRIES
+)
+
+def generation_fingerprint(prompt: str, model: str, system_instruction: str = None, max_tokens: int = None, length: str = "chapter") -> str:
+    """Hash of everything that shapes a generation - identifies identical requests"""
+    system = system_instruction or ISABELLA_SYSTEM_INSTRUCTION
+    model_key = WRITING_MODELS.get(model, WRITING_MODELS["gpt-4o"])
+    max_tokens = max_tokens or plan_max_tokens(length, model_key, estimate_tokens(system, prompt))
+    return generation_key(
+        system=system,
+        prompt=prompt,
+        model=model_key,
+        params=dict(SAMPLING_PARAMS, max_tokens=max_tokens)
+    )
+
+def generation_cache_key(prompt: str, model: str, length: str = "chapter") -> str:
+    """Cache key for a generation, or None when the cache is disabled"""
+    if not GENERATION_CACHE_ENABLED:
+        return None
+    return generation_fingerprint(prompt, model, length=length)
+
+# In-flight generations by fingerprint, so identical concurrent requests share one provider call
+_inflight_generations = {}
+coalescing_stats = {"provider_calls": 0, "coalesced": 0}
+
+async def call_writer_model_async(prompt: str, model: str, cache: bool = False, system_instruction: str = None,
+                                  max_tokens: int = None, priority: int = PRIORITY_NORMAL, length: str = "chapter") -> str:
+    """
+    Async entry point for writer model calls - admitted through the shared generation scheduler.
+    With cache=True an identical earlier generation is returned without calling the provider.
+    An identical request already in flight is joined instead of starting a second provider call.
+    `priority` orders this call in the scheduler queue (interactive requests jump ahead of batch work).
+    """
+    fingerprint = generation_fingerprint(prompt, model, system_instruction, max_tokens, length)
+    key = fingerprint if cache and GENERATION_CACHE_ENABLED else None
+    if key:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    generation = _inflight_generations.get(fingerprint)
+    if generation is not None:
+        coalescing_stats["coalesced"] += 1
+    else:
+        coalescing_stats["provider_calls"] += 1
+        generation = asyncio.ensure_future(_generate(prompt, model, key, system_instruction, max_tokens, priority, length))
+        _inflight_generations[fingerprint] = generation
+        generation.add_done_callback(lambda _: _inflight_generations.pop(fingerprint, None))
+    
+    # Shielded so one caller disconnecting doesn't cancel the call for the others
+    return await asyncio.shield(generation)
+
+async def _generate(prompt: str, model: str, cache_key: str = None, system_instruction: str = None,
+                    max_tokens: int = None, priority: int = PRIORITY_NORMAL, length: str = "chapter") -> str:
+    async with generation_scheduler.slot(priority):
+        text = await call_writer_model(prompt, model, system_instruction, max_tokens, length)
+    
+    if cache_key:
+        generation_cache.put(cache_key, text)
+    return text
 
 # ========================================
 # ROOT ENDPOINT
@@ -560,8 +1789,19 @@ async def root():
             "POST /story/create": "Generate a new story from prompt",
             "POST /story/continue": "Continue an existing story",
             "POST /story/revise": "Revise a specific chapter",
+            "POST /story/{create,continue,revise}/stream": "Same as above, streamed as Server-Sent Events",
+            "POST /story/batch": "Generate many stories concurrently (NDJSON results per item)",
+            "POST /jobs": "Queue a create/continue/revise job, returns a job id",
+            "GET /jobs/{job_id}": "Job status and result (GET /jobs/{job_id}/events to subscribe)",
+            "GET /uploads/{upload_id}": "Drive upload status for a saved chapter",
+            "POST /drive/bulk": "Batched Drive file operations (move, copy, rename, trash, delete, metadata)",
+            "GET /story/{project_name}/memory": "Rolling story memory used to continue a project",
+            "GET /story/{project_name}/chapters": "Indexed chapters of a project (GET .../chapters/{n} for the text)",
+            "GET /story/{project_name}/chapters/{n}/revisions": "Stored diffs of a chapter's revisions",
+            "GET /story/{project_name}/export?format=md|txt|epub": "Whole project as one streamed document",
             "GET /story/models": "List available writing models",
-            "GET /story/status": "System status"
+            "GET /story/status": "System status",
+            "GET /metrics": "Prometheus metrics"
         },
         "google_drive_integration": "Automatic story saving enabled",
         "openai_models": list(WRITING_MODELS.keys())
@@ -571,6 +1811,8 @@ async def root():
 # RUN
 # ========================================
 
+startup_timings = {"import_seconds": round(time.perf_counter() - _import_started, 3), "startup_seconds": None}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
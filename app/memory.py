@@ -0,0 +1,264 @@
+"""
+ISABELLA - ROLLING STORY MEMORY
+Per-project story bible (premise, arc, recent chapter summaries, characters, open threads,
+style notes) updated incrementally after every saved chapter, so continuation prompts stay
+the same size however long the project gets
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+RECENT_CHAPTERS = 3  # chapter summaries kept verbatim; older ones are folded into the arc
+SUMMARY_WORDS = 150
+ARC_WORDS = 350
+MAX_CHARACTERS = 16
+MAX_THREADS = 10
+MAX_STYLE_NOTES = 6
+NOTE_WORDS = 30
+TAIL_CHARS = 1500  # end of the latest chapter, so the next one picks up mid-scene
+
+MEMORY_SYSTEM = "You maintain the story bible for a serialized novel. Reply with a single JSON object and nothing else."
+
+UPDATE_PROMPT = """
+CURRENT STORY BIBLE (JSON):
+{memory}
+
+NEW CHAPTER {number}:
+{chapter}
+
+Update the story bible for the new chapter. Return ONLY this JSON object:
+{{
+  "chapter_summary": "what happens in chapter {number}, at most {summary_words} words",
+  "characters": {{"Name": "role, current state and goals, at most {note_words} words"}},
+  "threads": ["unresolved plot threads, questions and promises to the reader"],
+  "style": ["voice, tense, POV and tone notes a ghostwriter needs"]{arc_field}
+}}
+Keep at most {max_characters} characters (drop minor ones), {max_threads} threads (drop resolved ones)
+and {max_style} style notes.
+"""
+
+ARC_FIELD = """,
+  "arc": "the story so far up to chapter {through}: merge these summaries into the existing arc, at most {arc_words} words"
+RETIRING SUMMARIES: {retiring}"""
+
+
+def clip_words(text: str, words: int, keep_end: bool = False) -> str:
+    parts = str(text or "").split()
+    if len(parts) <= words:
+        return " ".join(parts)
+    return "... " + " ".join(parts[-words:]) if keep_end else " ".join(parts[:words]) + " ..."
+
+
+def parse_json_object(text: str) -> dict:
+    """First {...} block in a model reply, or {} if there is none"""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    try:
+        value = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def render_memory(memory: dict) -> str:
+    """Compact prompt block for a project's memory (bounded by the caps above)"""
+    sections = [f"PREMISE: {memory['premise']}"]
+    if memory.get("genre") and memory["genre"] != "auto":
+        sections.append(f"GENRE: {memory['genre']}")
+    if memory.get("arc"):
+        sections.append(f"STORY SO FAR: {memory['arc']}")
+    if memory.get("recent"):
+        sections.append("RECENT CHAPTERS:\n" + "\n".join(
+            f"- Chapter {item['chapter']}: {item['summary']}" for item in memory["recent"]
+        ))
+    if memory.get("characters"):
+        sections.append("CHARACTERS:\n" + "\n".join(f"- {name}: {note}" for name, note in memory["characters"].items()))
+    if memory.get("threads"):
+        sections.append("OPEN THREADS:\n" + "\n".join(f"- {thread}" for thread in memory["threads"]))
+    if memory.get("style"):
+        sections.append("STYLE:\n" + "\n".join(f"- {note}" for note in memory["style"]))
+    if memory.get("last_lines"):
+        sections.append(f"THE LAST CHAPTER ENDS:\n...{memory['last_lines']}")
+    return "\n\n".join(sections)
+
+
+class StoryMemory:
+    """
+    One JSON file per project under `memory_dir`. `summarize(prompt, max_tokens)` is an
+    awaitable model call returning text. Updates for a project run one at a time in the
+    order chapters were saved, each reading its chapter (a str, or a callable returning it)
+    only when it runs; get() waits for pending updates, while snapshot() never
+    waits and fills in what they have not applied yet from the saved chapters. If the
+    model reply can't be parsed, the chapter is still recorded with an extractive summary.
+    """
+
+    def __init__(self, memory_dir: Path, summarize):
+        self.memory_dir = memory_dir
+        self.summarize = summarize
+        self._memories = {}
+        self._pending = {}  # project -> task of the latest queued update
+        self._resets = {}  # project -> queued update that starts its memory afresh
+        self.updates = 0
+        self.fallbacks = 0
+        self.failed = 0
+
+    def _path(self, project: str) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9_-]", "_", project)[:60]
+        return self.memory_dir / f"{slug}-{hashlib.sha1(project.encode('utf-8')).hexdigest()[:8]}.json"
+
+    def _load(self, project: str) -> dict:
+        if project not in self._memories:
+            try:
+                self._memories[project] = json.loads(self._path(project).read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                return None
+        return self._memories[project]
+
+    def _save(self, memory: dict):
+        memory["updated_at"] = datetime.now().isoformat()
+        self.memory_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(memory["project"])
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(memory, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+        self._memories[memory["project"]] = memory
+
+    async def get(self, project: str) -> dict:
+        """The project's memory once every queued update has been applied, or None"""
+        pending = self._pending.get(project)
+        if pending:
+            await asyncio.wait([pending])
+        return self._load(project)
+
+    def snapshot(self, project: str, saved: dict, read_chapter) -> dict:
+        """
+        The last completed memory, without waiting for queued updates (they run at batch
+        priority, behind other generations), caught up to `saved`, the project's row in the
+        story index: chapters not applied yet get an extractive summary and the newest one's
+        ending becomes last_lines. `read_chapter(number)` returns a saved chapter's text.
+        """
+        memory = None if project in self._resets else self._load(project)
+        if not saved or not saved["chapters"]:
+            return memory
+        if memory is None:
+            memory = self._blank(project, premise=clip_words(saved["premise"] or "", ARC_WORDS), genre=saved["genre"] or "auto")
+        if memory["chapters"] >= saved["chapters"]:
+            return memory
+
+        memory = dict(memory)
+        text = ""
+        for number in range(max(memory["chapters"], saved["chapters"] - RECENT_CHAPTERS) + 1, saved["chapters"] + 1):
+            text = read_chapter(number) or ""
+            summary = {"chapter": number, "summary": clip_words(self._extract_summary(text), SUMMARY_WORDS)}
+            memory["recent"] = (memory["recent"] + [summary])[-RECENT_CHAPTERS:]
+        memory["chapters"] = saved["chapters"]
+        memory["last_lines"] = text.strip()[-TAIL_CHARS:]
+        return memory
+
+    def start(self, project: str, premise: str, genre: str, chapter) -> asyncio.Task:
+        """Begin a fresh memory for a new story and queue its first chapter"""
+        return self._enqueue(project, chapter, {"premise": clip_words(premise, ARC_WORDS), "genre": genre})
+
+    def add_chapter(self, project: str, chapter) -> asyncio.Task:
+        """Queue an incremental update for the next saved chapter"""
+        return self._enqueue(project, chapter)
+
+    def _enqueue(self, project: str, chapter, reset: dict = None) -> asyncio.Task:
+        previous = self._pending.get(project)
+        task = asyncio.ensure_future(self._run(project, chapter, previous, reset))
+        self._pending[project] = task
+        if reset:
+            self._resets[project] = task
+
+        def done(_):
+            if self._pending.get(project) is task:
+                del self._pending[project]
+            if self._resets.get(project) is task:
+                del self._resets[project]
+        task.add_done_callback(done)
+        return task
+
+    async def _run(self, project: str, chapter, previous: asyncio.Task, reset: dict):
+        if previous:
+            await asyncio.wait([previous])
+        try:
+            await self._update(project, chapter, reset)
+        except Exception as e:
+            self.failed += 1
+            print(f"WARNING: Story memory update failed for {project}: {e}")
+
+    async def _update(self, project: str, chapter, reset: dict = None):
+        if callable(chapter):
+            chapter = chapter() or ""
+        memory = self._load(project)
+        if reset or memory is None:
+            memory = self._blank(project, **(reset or {}))
+        number = memory["chapters"] + 1
+        keep = RECENT_CHAPTERS - 1
+        retiring = memory["recent"][:-keep] if keep else memory["recent"]
+        retiring = retiring if len(memory["recent"]) >= RECENT_CHAPTERS else []
+
+        bible = {key: memory[key] for key in ("premise", "arc", "recent", "characters", "threads", "style")}
+        prompt = UPDATE_PROMPT.format(
+            memory=json.dumps(bible, indent=1), number=number, chapter=chapter,
+            summary_words=SUMMARY_WORDS, note_words=NOTE_WORDS, max_characters=MAX_CHARACTERS,
+            max_threads=MAX_THREADS, max_style=MAX_STYLE_NOTES,
+            arc_field=ARC_FIELD.format(
+                through=retiring[-1]["chapter"], arc_words=ARC_WORDS,
+                retiring=json.dumps(retiring)
+            ) if retiring else "",
+        )
+        try:
+            update = parse_json_object(await self.summarize(prompt, 1500))
+        except Exception as e:
+            print(f"WARNING: Story memory summary failed for {project}: {e}")
+            update = {}
+        if not update.get("chapter_summary"):
+            self.fallbacks += 1
+
+        summary = update.get("chapter_summary") or self._extract_summary(chapter)
+        memory["recent"] = memory["recent"][len(retiring):] + [{"chapter": number, "summary": clip_words(summary, SUMMARY_WORDS)}]
+        if retiring:
+            fallback_arc = " ".join([memory["arc"]] + [f"Ch. {item['chapter']}: {item['summary']}" for item in retiring])
+            memory["arc"] = clip_words(update.get("arc") or fallback_arc, ARC_WORDS, keep_end=not update.get("arc"))
+        if isinstance(update.get("characters"), dict):
+            memory["characters"] = {
+                str(name): clip_words(note, NOTE_WORDS)
+                for name, note in list(update["characters"].items())[:MAX_CHARACTERS]
+            }
+        for key, limit in (("threads", MAX_THREADS), ("style", MAX_STYLE_NOTES)):
+            if isinstance(update.get(key), list):
+                memory[key] = [clip_words(item, NOTE_WORDS) for item in update[key][:limit]]
+        memory["chapters"] = number
+        memory["last_lines"] = chapter.strip()[-TAIL_CHARS:]
+        self._save(memory)
+        self.updates += 1
+
+    @staticmethod
+    def _blank(project: str, **fields) -> dict:
+        return {
+            "project": project, "premise": "", "genre": "auto", "chapters": 0, "arc": "", "recent": [],
+            "characters": {}, "threads": [], "style": [], "last_lines": "", **fields,
+        }
+
+    @staticmethod
+    def _extract_summary(chapter: str) -> str:
+        """Opening and closing sentences of the chapter when no model summary is available"""
+        words = chapter.split()
+        half = (SUMMARY_WORDS - 1) // 2
+        if len(words) <= SUMMARY_WORDS:
+            return " ".join(words)
+        return " ".join(words[:half]) + " ... " + " ".join(words[-half:])
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "fallback_summaries": self.fallbacks,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "loaded_projects": len(self._memories),
+        }
@@ -0,0 +1,237 @@
+"""
+ISABELLA - METRICS
+Dependency-free Prometheus counters, gauges and histograms, the metrics the service
+records on its hot paths, and an ASGI middleware timing every request
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Child for one label combination (created on first use and reused after that)"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, values: tuple, child) -> list:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values: tuple, child) -> list:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format (0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========================================
+# ISABELLA METRICS
+# ========================================
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "isabella_http_request_duration_seconds", "HTTP request latency until the response body is complete",
+    ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = Gauge("isabella_http_requests_in_flight", "HTTP requests currently being served")
+QUEUE_WAIT_SECONDS = Histogram(
+    "isabella_generation_queue_wait_seconds", "Time a generation waited for a scheduler slot", ("priority",)
+)
+QUEUE_DEPTH = Gauge("isabella_generation_queue", "Generations running or waiting for a slot", ("state",))
+PROVIDER_SECONDS = Histogram(
+    "isabella_provider_request_duration_seconds", "LLM provider call latency", ("provider", "model", "outcome")
+)
+PROVIDER_TTFT_SECONDS = Histogram(
+    "isabella_provider_time_to_first_token_seconds", "Time to the first streamed token", ("provider", "model")
+)
+PROVIDER_TOKENS = Counter(
+    "isabella_provider_tokens_total", "Prompt and completion tokens by provider and model", ("provider", "model", "kind")
+)
+COMPLETION_TOKENS = Histogram(
+    "isabella_completion_tokens", "Completion tokens per provider call", ("provider", "model"), buckets=TOKEN_BUCKETS
+)
+DRIVE_SECONDS = Histogram(
+    "isabella_drive_request_duration_seconds", "Google Drive call latency", ("operation", "outcome")
+)
+DRIVE_UPLOAD_BYTES = Counter("isabella_drive_upload_bytes_total", "Bytes sent in Drive uploads", ("mode",))
+DRIVE_UPLOAD_THROUGHPUT = Histogram(
+    "isabella_drive_upload_throughput_bytes_per_second", "Throughput of each resumable Drive upload",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+)
+DRIVE_UPLOAD_RESUMES = Counter("isabella_drive_upload_resumes_total", "Resumable uploads continued from a saved session")
+UPLOAD_PENDING = Gauge("isabella_drive_uploads_pending", "Chapters staged and waiting for Drive upload")
+ERRORS = Counter("isabella_errors_total", "Errors by component and type", ("component", "type"))
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "isabella_event_loop_lag_seconds", "How late a periodic event-loop timer fires",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+def record_error(component: str, error: BaseException):
+    ERRORS.labels(component, type(error).__name__).inc()
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Sample event-loop lag forever: how much later than requested a sleep wakes up"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times each HTTP request until its last body chunk is sent
+    (so streamed responses are measured in full) and labels it with the route template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            record_error("http", e)
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status["code"])
+            ).observe(time.perf_counter() - started)
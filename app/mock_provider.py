@@ -0,0 +1,71 @@
+"""
+ISABELLA - MOCK PROVIDER
+Offline stand-in for OpenAI/OpenRouter with configurable latency, token rate and error rate
+"""
+
+import asyncio
+import random
+
+from app.ratelimit import estimate_tokens
+from app.routing import ProviderError, Completion
+
+MOCK_SENTENCES = [
+    "The rain had not stopped for three days, and Mara had stopped pretending she minded.",
+    "Somewhere below the window a tram complained its way around the corner.",
+    "She read the letter again, slower this time, as if the words might rearrange themselves.",
+    "Nobody in the house spoke of the locked room, which was how everyone knew it mattered.",
+    "He smiled the way people smile at funerals, carefully and for someone else.",
+    "By morning the harbour had frozen, and the boats sat in it like unfinished thoughts.",
+]
+
+
+class MockProvider:
+    """
+    Generates filler prose locally. `latency` is the time to first token, `tokens_per_second`
+    paces the rest (0 = instant), and `error_rate` makes that fraction of calls fail as retryable.
+    """
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 0, error_rate: float = 0.0, words: int = 400):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.words = words
+        self.calls = 0
+
+    def _words(self, max_tokens: int = None) -> list:
+        """Up to `words` words, cut short (like a real provider) when max_tokens is smaller"""
+        count = min(self.words, int(max_tokens * 0.75)) if max_tokens else self.words
+        words = []
+        while len(words) < count:
+            words.extend(random.choice(MOCK_SENTENCES).split())
+            if random.random() < 0.2:
+                words[-1] += "\n\n"
+        return words[:count]
+
+    async def _start(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise ProviderError("Mock API error: simulated provider failure")
+
+    def _finish_reason(self, words: list, max_tokens: int = None) -> str:
+        return "length" if max_tokens and len(words) < self.words else "stop"
+
+    async def complete(self, model: str, system: str, prompt: str, max_tokens: int = None, timeout: float = None) -> Completion:
+        await self._start()
+        words = self._words(max_tokens)
+        if self.tokens_per_second:
+            await asyncio.sleep(len(words) / self.tokens_per_second)
+        text = " ".join(words).replace("\n\n ", "\n\n")
+        return Completion(text, self._finish_reason(words, max_tokens), int(len(words) / 0.75), estimate_tokens(system, prompt))
+
+    async def stream(self, model: str, system: str, prompt: str, max_tokens: int = None, timeout: float = None, outcome: dict = None):
+        await self._start()
+        words = self._words(max_tokens)
+        for word in words:
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield word if word.endswith("\n\n") else word + " "
+        if outcome is not None:
+            outcome["finish_reason"] = self._finish_reason(words, max_tokens)
+            outcome["completion_tokens"] = int(len(words) / 0.75)
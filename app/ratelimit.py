@@ -0,0 +1,209 @@
+"""
+ISABELLA - CLIENT-SIDE RATE LIMITING
+Token buckets for provider requests-per-minute and tokens-per-minute limits
+"""
+
+import asyncio
+import heapq
+import itertools
+import re
+import time
+
+
+CHARS_PER_TOKEN = 4  # English prose
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prose)"""
+    return sum(len(text or "") for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def _number(value: str) -> float:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_duration(value: str) -> float:
+    """Parse rate-limit reset values such as '1s', '6m0s', '20ms' or a bare number of seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total or None
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; `blocked_until` pauses it until the provider's reset time"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def consume(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return max(0.0, self.level)
+
+    def sync(self, limit: float = None, remaining: float = None, reset_seconds: float = None):
+        """Adopt the provider's own view of the limit and what is left of it"""
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.capacity, float(remaining))
+            if remaining <= 0 and reset_seconds:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+
+
+class RateLimiter:
+    """
+    RPM/TPM buckets per scope. A call to `provider`/`model` must fit in both the
+    provider-wide scope and the `provider:model` scope. Scopes come from `limits`
+    ({"openai": {"rpm": 500, "tpm": 150000}, "openai:gpt-4o": {...}}) or are learned from
+    the provider's x-ratelimit-* response headers. Callers waiting on a provider are served
+    in priority order (lowest value first, then FIFO), so a refill goes to interactive work first.
+    """
+
+    def __init__(self, limits: dict = None):
+        self.buckets = {}
+        self.paused_until = {}  # scope -> monotonic time, set from Retry-After on a 429
+        self._queues = {}  # provider -> heap of (priority, sequence, turn event) of waiting callers
+        self._sequence = itertools.count()
+        for scope, limit in (limits or {}).items():
+            self._scope(scope, limit.get("rpm"), limit.get("tpm"))
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def _scope(self, scope: str, rpm: float = None, tpm: float = None) -> dict:
+        buckets = self.buckets.setdefault(scope, {})
+        if rpm and "rpm" not in buckets:
+            buckets["rpm"] = TokenBucket(rpm)
+        if tpm and "tpm" not in buckets:
+            buckets["tpm"] = TokenBucket(tpm)
+        return buckets
+
+    def _buckets(self, provider: str, model: str):
+        for scope in (provider, f"{provider}:{model}"):
+            buckets = self.buckets.get(scope, {})
+            if "rpm" in buckets:
+                yield buckets["rpm"], 1
+            if "tpm" in buckets:
+                yield buckets["tpm"], None
+
+    async def acquire(self, provider: str, model: str, tokens: int, release=None, priority: int = 0):
+        """
+        Wait until one request of `tokens` estimated tokens fits every applicable bucket, then
+        reserve it. If it has to wait, the wait and the reservation happen inside `release()`,
+        an async context manager (the caller's generation slot is given back meanwhile).
+        """
+        started = time.monotonic()
+        if release is not None and (self._queues.get(provider) or self._wait_time(provider, model, tokens) > 0):
+            async with release():
+                await self._reserve(provider, model, tokens, priority)
+        else:
+            await self._reserve(provider, model, tokens, priority)
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_seconds += waited
+
+    def _wait_time(self, provider: str, model: str, tokens: int) -> float:
+        paused = max(self.paused_until.get(scope, 0.0) for scope in (provider, f"{provider}:{model}")) - time.monotonic()
+        return max([paused] + [bucket.wait_time(amount or tokens) for bucket, amount in self._buckets(provider, model)])
+
+    async def _reserve(self, provider: str, model: str, tokens: int, priority: int):
+        """Only the best waiter for the provider watches the buckets; the others wait for their turn"""
+        queue = self._queues.setdefault(provider, [])
+        turn = asyncio.Event()
+        entry = (priority, next(self._sequence), turn)
+        heapq.heappush(queue, entry)
+        try:
+            while True:
+                if queue[0] is not entry:
+                    turn.clear()
+                    await turn.wait()
+                    continue
+                wait = self._wait_time(provider, model, tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 5.0))
+            for bucket, amount in self._buckets(provider, model):
+                bucket.consume(amount or tokens)
+        finally:
+            queue.remove(entry)
+            heapq.heapify(queue)
+            if queue:
+                queue[0][2].set()
+
+    def settle(self, provider: str, model: str, reserved: int, used: int):
+        """Return the unused part of a token reservation once actual usage is known"""
+        if used is None or used >= reserved:
+            return
+        for bucket, amount in self._buckets(provider, model):
+            if amount is None:
+                bucket.refund(reserved - used)
+
+    def update_from_headers(self, provider: str, model: str, headers, status_code: int = 200):
+        """Resize/refill buckets from x-ratelimit-* headers; a 429 pauses the scope for Retry-After"""
+        scope = f"{provider}:{model}"
+        buckets = self.buckets.setdefault(scope, {})
+        for kind, suffix in (("rpm", "requests"), ("tpm", "tokens")):
+            limit = _number(headers.get(f"x-ratelimit-limit-{suffix}"))
+            if limit and kind not in buckets:
+                buckets[kind] = TokenBucket(limit)
+            if kind in buckets:
+                buckets[kind].sync(
+                    limit,
+                    _number(headers.get(f"x-ratelimit-remaining-{suffix}")),
+                    parse_duration(headers.get(f"x-ratelimit-reset-{suffix}")),
+                )
+        if status_code == 429:
+            self.throttled += 1
+            pause = parse_duration(headers.get("retry-after")) or 1.0
+            self.paused_until[scope] = max(self.paused_until.get(scope, 0.0), time.monotonic() + pause)
+            return pause
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 2),
+            "throttled_by_provider": self.throttled,
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+            "scopes": {
+                scope: {kind: {"limit": bucket.capacity, "available": round(bucket.available(), 1)}
+                        for kind, bucket in buckets.items()}
+                for scope, buckets in self.buckets.items()
+            },
+        }
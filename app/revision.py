@@ -0,0 +1,121 @@
+"""
+ISABELLA - PARTIAL REVISIONS
+Find the paragraphs a revision note is about, rewrite only those spans (concurrently)
+and splice them back into the chapter
+"""
+
+import asyncio
+import difflib
+
+from app.longform import split_paragraphs
+from app.memory import parse_json_object
+
+PARTIAL_MAX_FRACTION = 0.5  # above this share of paragraphs a full rewrite is cheaper and more coherent
+
+LOCATE_SYSTEM = "You are a developmental editor. Reply with a single JSON object and nothing else."
+
+LOCATE_PROMPT = """
+REVISION NOTES: {feedback}
+
+CHAPTER (numbered paragraphs):
+{numbered}
+
+Which paragraphs must change to address the revision notes? Return ONLY:
+{{"scope": "partial" or "full", "paragraphs": [paragraph numbers that must be rewritten]}}
+Use "full" when the notes concern the whole chapter (overall tone, pacing, POV, tense, length).
+"""
+
+SPAN_PROMPT = """
+REVISING CHAPTER {chapter}, PARAGRAPHS {first}-{last} OF {total}
+
+REVISION NOTES: {feedback}
+
+TEXT JUST BEFORE THE PASSAGE:
+{before}
+
+PASSAGE TO REVISE:
+{passage}
+
+TEXT JUST AFTER THE PASSAGE:
+{after}
+
+Rewrite ONLY the passage so it addresses the revision notes. It must flow from the text before
+and into the text after without repeating them; keep voice, tense and POV; keep roughly the same
+length unless the notes ask otherwise. Return ONLY the rewritten passage.
+"""
+
+
+def number_paragraphs(paragraphs: list) -> str:
+    return "\n\n".join(f"[{i + 1}] {paragraph}" for i, paragraph in enumerate(paragraphs))
+
+
+def merge_spans(indexes: list, total: int) -> list:
+    """Zero-based paragraph indexes -> sorted (start, end) spans (end exclusive), adjacent ones merged"""
+    spans = []
+    for index in sorted({i for i in indexes if 0 <= i < total}):
+        if spans and index <= spans[-1][1]:
+            spans[-1][1] = index + 1
+        else:
+            spans.append([index, index + 1])
+    return [tuple(span) for span in spans]
+
+
+async def locate_spans(paragraphs: list, feedback: str, generate) -> list:
+    """
+    Spans the revision notes are about, or None when the chapter needs a full rewrite
+    (the model says so, its reply is unusable, or the spans cover too much of the chapter).
+    """
+    reply = parse_json_object(await generate(
+        LOCATE_PROMPT.format(feedback=feedback, numbered=number_paragraphs(paragraphs)), 300, LOCATE_SYSTEM
+    ))
+    numbers = reply.get("paragraphs")
+    if reply.get("scope") == "full" or not isinstance(numbers, list):
+        return None
+    spans = merge_spans([int(n) - 1 for n in numbers if str(n).isdigit()], len(paragraphs))
+    covered = sum(end - start for start, end in spans)
+    if not spans or covered > len(paragraphs) * PARTIAL_MAX_FRACTION:
+        return None
+    return spans
+
+
+async def revise_spans(paragraphs: list, spans: list, feedback: str, chapter: int, generate) -> list:
+    """Rewrite every span concurrently and return the spliced paragraph list"""
+    async def revise(start: int, end: int) -> list:
+        passage = "\n\n".join(paragraphs[start:end])
+        rewritten = await generate(
+            SPAN_PROMPT.format(
+                chapter=chapter, first=start + 1, last=end, total=len(paragraphs), feedback=feedback,
+                before=paragraphs[start - 1] if start > 0 else "(chapter start)",
+                passage=passage,
+                after=paragraphs[end] if end < len(paragraphs) else "(chapter end)",
+            ),
+            int(len(passage.split()) * 2.7) + 300,
+            None
+        )
+        return split_paragraphs(rewritten) or paragraphs[start:end]
+
+    revised = await asyncio.gather(*[revise(start, end) for start, end in spans])
+
+    result, position = [], 0
+    for (start, end), replacement in zip(spans, revised):
+        result.extend(paragraphs[position:start])
+        result.extend(replacement)
+        position = end
+    result.extend(paragraphs[position:])
+    return result
+
+
+def paragraph_diff(old: str, new: str, label: str) -> str:
+    """Unified diff of two chapter versions, one paragraph per line"""
+    return "\n".join(difflib.unified_diff(
+        split_paragraphs(old), split_paragraphs(new),
+        fromfile=f"{label} (before)", tofile=f"{label} (after)", lineterm="", n=1
+    ))
+
+
+def diff_stats(diff: str) -> dict:
+    lines = diff.splitlines()[2:]
+    return {
+        "paragraphs_added": sum(1 for line in lines if line.startswith("+")),
+        "paragraphs_removed": sum(1 for line in lines if line.startswith("-")),
+    }
@@ -0,0 +1,244 @@
+"""
+ISABELLA - PROVIDER ROUTING
+Latency/error-aware provider selection with circuit breakers and optional hedged requests
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from app.metrics import PROVIDER_SECONDS, PROVIDER_TOKENS, COMPLETION_TOKENS, record_error
+from app.tracing import tracer
+
+
+@dataclass
+class Completion:
+    """One provider response: text, why it stopped ('stop', 'length', ...) and token counts"""
+    text: str
+    finish_reason: str = None
+    completion_tokens: int = 0
+    prompt_tokens: int = 0
+
+
+class ProviderError(RuntimeError):
+    """Provider call failure; `retryable` failures count against provider health and fail over"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class ProviderRateLimited(ProviderError):
+    """The provider answered 429; `retry_after` is its Retry-After in whole seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, retryable=True)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def record_completion(provider: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+    """Latency and token metrics for one successful provider call"""
+    PROVIDER_SECONDS.labels(provider, model, "ok").observe(seconds)
+    PROVIDER_TOKENS.labels(provider, model, "prompt").inc(prompt_tokens)
+    PROVIDER_TOKENS.labels(provider, model, "completion").inc(completion_tokens)
+    COMPLETION_TOKENS.labels(provider, model).observe(completion_tokens)
+
+
+class ProviderHealth:
+    """Rolling latency/error window and circuit-breaker state for one provider"""
+
+    def __init__(self, window: int, failure_threshold: int, cooldown: float):
+        self.samples = deque(maxlen=window)  # (latency_seconds, ok)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def available(self) -> bool:
+        """Closed circuits take traffic; an open circuit lets one trial call through after the cooldown"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        return self.state == "half_open" and not self.trial_in_flight
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((latency, ok))
+        self.trial_in_flight = False
+        if ok:
+            self.consecutive_failures = 0
+            self.state = "closed"
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"WARNING: Provider circuit opened after {self.consecutive_failures} failure(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def latency(self, quantile: float) -> float:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * quantile))]
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def score(self) -> float:
+        """Lower is better: median latency inflated by the recent error rate"""
+        p50 = self.latency(0.5)
+        return (p50 if p50 is not None else 0.0) * (1 + 4 * self.error_rate())
+
+    def stats(self) -> dict:
+        p50, p95 = self.latency(0.5), self.latency(0.95)
+        return {
+            "circuit": self.state,
+            "samples": len(self.samples),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class ProviderRouter:
+    """
+    Routes each call to the healthiest provider.
+
+    `providers` maps a name to `async fn(model, system, prompt, max_tokens, timeout) -> Completion`;
+    `preference` is the tie-break order. Retryable failures fail over to the next
+    provider. With `hedge=True`, a backup call goes to the runner-up once the primary
+    has been running longer than its own p95, and the first success wins.
+    """
+
+    def __init__(self, providers: dict, preference: list, window: int = 50, failure_threshold: int = 3,
+                 cooldown: float = 30.0, hedge: bool = False, hedge_min_delay: float = 2.0, min_samples: int = 10):
+        self.providers = providers
+        self.preference = [name for name in preference if name in providers]
+        self.health = {name: ProviderHealth(window, failure_threshold, cooldown) for name in self.providers}
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def candidates(self) -> list:
+        """Available providers, best first (preference order breaks ties and covers cold starts)"""
+        available = [name for name in self.preference if self.health[name].available()]
+        if not available:
+            # Every circuit is open - try the one that opened first rather than failing outright
+            available = sorted(self.preference, key=lambda name: self.health[name].opened_at)[:1]
+        return sorted(available, key=lambda name: (self.health[name].score(), self.preference.index(name)))
+
+    def record(self, name: str, latency: float, ok: bool):
+        self.health[name].record(latency, ok)
+
+    async def _attempt(self, name: str, *args) -> Completion:
+        with tracer.span("provider_call", provider=name, model=args[0]) as span:
+            result = await self._call_provider(name, *args)
+            span.set(finish_reason=result.finish_reason, completion_tokens=result.completion_tokens)
+            return result
+
+    async def _call_provider(self, name: str, *args) -> Completion:
+        health = self.health[name]
+        if health.state == "half_open":
+            health.trial_in_flight = True
+        model = args[0]
+        started = time.monotonic()
+        try:
+            result = await self.providers[name](*args)
+        except ProviderError as e:
+            health.trial_in_flight = False
+            if e.retryable:
+                self.record(name, time.monotonic() - started, False)
+            PROVIDER_SECONDS.labels(name, model, "error").observe(time.monotonic() - started)
+            record_error("provider", e)
+            raise
+        except asyncio.CancelledError:
+            health.trial_in_flight = False  # lost a hedge race - says nothing about health
+            PROVIDER_SECONDS.labels(name, model, "cancelled").observe(time.monotonic() - started)
+            raise
+        self.record(name, time.monotonic() - started, True)
+        record_completion(name, model, time.monotonic() - started, result.prompt_tokens, result.completion_tokens)
+        return result
+
+    def _hedge_delay(self, name: str) -> float:
+        health = self.health[name]
+        if not self.hedge or len(health.samples) < self.min_samples:
+            return None
+        p95 = health.latency(0.95)
+        return max(self.hedge_min_delay, p95) if p95 is not None else None
+
+    async def call(self, model: str, system: str, prompt: str, max_tokens: int = None, timeout: float = None) -> Completion:
+        if not self.preference:
+            raise RuntimeError("No API keys configured (OPENAI_API_KEY or OPENROUTER_API_KEY required)")
+        order = self.candidates()
+        args = (model, system, prompt, max_tokens, timeout)
+
+        delay = self._hedge_delay(order[0]) if len(order) > 1 else None
+        if delay is not None:
+            return await self._hedged(order[0], order[1], delay, args)
+
+        last_error = None
+        for i, name in enumerate(order):
+            try:
+                return await self._attempt(name, *args)
+            except ProviderError as e:
+                if not e.retryable:
+                    raise
+                last_error = e
+                if i + 1 < len(order):
+                    self.failovers += 1
+        raise last_error
+
+    async def _hedged(self, primary: str, backup: str, delay: float, args: tuple) -> Completion:
+        """Start the primary; if it is still running after `delay`, race the backup against it"""
+        tasks = {asyncio.ensure_future(self._attempt(primary, *args)): primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                task = done.pop()
+                del tasks[task]
+                error = task.exception()
+                if error is None:
+                    return task.result()
+                if not (isinstance(error, ProviderError) and error.retryable):
+                    raise error
+                self.failovers += 1
+                return await self._attempt(backup, *args)
+
+            self.hedged += 1
+            tasks[asyncio.ensure_future(self._attempt(backup, *args))] = backup
+            last_error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is None:
+                        if name == backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "preference": self.preference,
+            "order": self.candidates() if self.preference else [],
+            "hedging": self.hedge,
+            "hedged_requests": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "providers": {name: health.stats() for name, health in self.health.items()},
+        }
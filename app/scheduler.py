@@ -0,0 +1,171 @@
+"""
+ISABELLA - GENERATION SCHEDULER
+Process-wide admission control for writer model calls
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from app.metrics import QUEUE_WAIT_SECONDS
+from app.tracing import tracer
+
+# Lower value = served first. Interactive continues jump ahead of new stories; batch/background work goes last.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BATCH: "batch"}
+
+# Background runners (jobs, batches) set this so everything they call is demoted to at least this priority
+priority_floor = ContextVar("generation_priority_floor", default=PRIORITY_INTERACTIVE)
+
+# The slot held by the current task: {"scheduler", "priority", "held"}; released() flips "held"
+_current_slot = ContextVar("generation_current_slot", default=None)
+
+
+class GenerationQueueFull(Exception):
+    """Raised when the wait queue is full; carries a Retry-After hint in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class GenerationScheduler:
+    """
+    Caps concurrent generations and bounds the number of callers waiting for a slot.
+    Slots are handed directly to the best waiter on release: lowest priority value, then FIFO.
+    A slot holder that has to wait on something else (a rate limit) gives the slot back
+    through released() and queues for it again at its own priority.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._active = 0
+        self._waiters = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._wait_times = deque(maxlen=500)
+        self._service_time = 30.0  # EWMA of slot hold time, seeds Retry-After
+        self.admitted = 0
+        self.rejected = 0
+        self.yielded = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queued caller would be admitted"""
+        rounds = (self.queued + 1) / self.max_concurrency
+        return max(1, int(rounds * self._service_time))
+
+    def check_admission(self):
+        """Raise GenerationQueueFull now if a new caller would be rejected (no slot is reserved)"""
+        if self._active >= self.max_concurrency and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise GenerationQueueFull(self.retry_after())
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL, readmit: bool = False):
+        """Wait for a generation slot or raise GenerationQueueFull (never when `readmit`ting a caller that gave its slot back)"""
+        priority = max(priority, priority_floor.get())
+        enqueued_at = time.monotonic()
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+        else:
+            if len(self._waiters) >= self.max_queue and not readmit:
+                self.rejected += 1
+                raise GenerationQueueFull(self.retry_after())
+            waiter = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._sequence), waiter)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Slot was handed over just as we were cancelled - pass it on
+                    self.release()
+                elif entry in self._waiters:  # release() may already have popped a cancelled waiter
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+        self.admitted += 1
+        self._wait_times.append(time.monotonic() - enqueued_at)
+        QUEUE_WAIT_SECONDS.labels(PRIORITY_NAMES.get(priority, str(priority))).observe(self._wait_times[-1])
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL):
+        """Hold a generation slot for the duration of the block"""
+        with tracer.span("generation_queue_wait", priority=PRIORITY_NAMES.get(priority, priority)):
+            await self.acquire(priority)
+        current = {"scheduler": self, "priority": max(priority, priority_floor.get()), "held": True}
+        token = _current_slot.set(current)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            _current_slot.reset(token)
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            if current["held"]:
+                self.release()
+
+    def current_priority(self) -> int:
+        """Priority of the slot the current task holds (else its priority floor)"""
+        current = _current_slot.get()
+        return current["priority"] if current is not None and current["scheduler"] is self else priority_floor.get()
+
+    @asynccontextmanager
+    async def released(self):
+        """Give the current task's slot back for the duration of the block, then queue for it again"""
+        current = _current_slot.get()
+        if current is None or current["scheduler"] is not self or not current["held"]:
+            yield
+            return
+        current["held"] = False
+        self.yielded += 1
+        self.release()
+        yield  # if the block raises, the slot stays given back and slot() has nothing to release
+        with tracer.span("generation_queue_wait", priority=PRIORITY_NAMES.get(current["priority"], current["priority"])):
+            await self.acquire(current["priority"], readmit=True)
+        current["held"] = True
+
+    def stats(self) -> dict:
+        """Queue depth and wait-time summary for status reporting"""
+        waits = sorted(self._wait_times)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "queued_by_priority": {
+                name: sum(1 for entry in self._waiters if entry[0] == value)
+                for value, name in PRIORITY_NAMES.items()
+            },
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "yielded_for_rate_limits": self.yielded,
+            "wait_seconds": {
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95": round(p95, 3),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "avg_service_seconds": round(self._service_time, 2),
+        }
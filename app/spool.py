@@ -0,0 +1,97 @@
+"""
+ISABELLA - STREAMED TEXT SPOOL
+Generated text teed, as it arrives, into a running word count, a preview, a short tail
+and (for chapters) a UTF-8 file on disk, so the stream itself holds no growing copy of
+the chapter; consumers read it back from the file in chunks, or whole when they must
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+WORD = re.compile(r"\S+")
+CHUNK_CHARS = 64 * 1024
+
+
+def count_words(text: str) -> int:
+    """len(text.split()) without building the list of words"""
+    return sum(1 for _ in WORD.finditer(text or ""))
+
+
+class TextStats:
+    """
+    feed(text) updates `chars`, `words` (a word split across two pieces counts once),
+    `preview` (the first `preview_chars` characters) and `tail` (the last `tail_chars`).
+    """
+
+    def __init__(self, preview_chars: int = 500, tail_chars: int = 0):
+        self.preview_chars = preview_chars
+        self.tail_chars = tail_chars
+        self.chars = 0
+        self.words = 0
+        self.preview = ""
+        self.tail = ""
+        self._in_word = False
+
+    def feed(self, text: str):
+        if not text:
+            return
+        self.chars += len(text)
+        self.words += count_words(text) - (self._in_word and not text[0].isspace())
+        self._in_word = not text[-1].isspace()
+        if len(self.preview) < self.preview_chars:
+            self.preview += text[:self.preview_chars - len(self.preview)]
+        if self.tail_chars:
+            self.tail = (self.tail + text)[-self.tail_chars:]
+
+
+class ChapterSpool(TextStats):
+    """
+    A chapter being streamed to `path`: write(text) appends it to the file and feeds the
+    stats, and `digest` is the SHA-256 of everything written. close() flushes it to disk;
+    chunks() reads it back a piece at a time (e.g. into the story index), read_text()
+    whole, for callers that need the full string (the generation cache, revision diffs).
+    """
+
+    def __init__(self, path: Path, preview_chars: int = 500):
+        super().__init__(preview_chars)
+        self.path = path
+        self.bytes = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, "wb")
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self._hash.update(data)
+        self.bytes += len(data)
+        self.feed(text)
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def chunks(self, size: int = CHUNK_CHARS):
+        self.close()
+        with open(self.path, encoding="utf-8") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def read_text(self) -> str:
+        self.close()
+        return self.path.read_text(encoding="utf-8")
+
+    def discard(self):
+        """Drop an unfinished chapter (the stream failed)"""
+        self._file.close()
+        self.path.unlink(missing_ok=True)
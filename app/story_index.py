@@ -0,0 +1,300 @@
+"""
+ISABELLA - PROJECT / CHAPTER INDEX
+Local SQLite index of projects and chapters (text, word counts, Drive file ids) -
+the source of truth for chapter numbering and chapter lookups
+"""
+
+import itertools
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from app.revision import paragraph_diff
+from app.spool import ChapterSpool, count_words
+
+CHAPTER_FIELDS = (
+    "project", "number", "title", "word_count", "revision",
+    "upload_id", "drive_status", "drive_file_id", "drive_link", "created_at", "updated_at",
+)
+
+
+class StoryIndex:
+    """
+    Projects and their chapters, keyed by (project, number). Numbers for new chapters
+    are assigned inside a single INSERT, so concurrent continuations (even from several
+    processes sharing the file) never get the same number. Chapter text is a str or a
+    ChapterSpool, which is appended to its row a chunk at a time. Drive fields are filled
+    in from upload records as uploads finish.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS projects (
+                    name TEXT PRIMARY KEY,
+                    premise TEXT,
+                    genre TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chapters (
+                    project TEXT NOT NULL,
+                    number INTEGER NOT NULL,
+                    title TEXT,
+                    text TEXT NOT NULL,
+                    word_count INTEGER NOT NULL,
+                    revision INTEGER NOT NULL DEFAULT 1,
+                    upload_id TEXT,
+                    drive_status TEXT,
+                    drive_file_id TEXT,
+                    drive_link TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (project, number)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chapters_upload ON chapters (upload_id)")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS revisions (
+                    project TEXT NOT NULL,
+                    number INTEGER NOT NULL,
+                    revision INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    feedback TEXT,
+                    diff TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (project, number, revision)
+                )"""
+            )
+
+    def start_project(self, name: str, premise: str, genre: str, title: str, text, replace: bool = False) -> dict:
+        """
+        Start a story with `text` as chapter 1 and return that chapter; its `project` is the
+        key the story was indexed under. If `name` already has chapters:
+        - with `replace`, chapter 1 is replaced as a new revision (`replaced` in the result),
+          and its history and the later chapters are kept;
+        - a story started from the same premise (a retried create) is returned as it is, with
+          `existing` set, and nothing is written;
+        - any other story goes under the first free key of "name (2)", "name (3)", ...
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            if not replace:
+                name, existing = self._story_key(name, premise)
+                if existing:
+                    return dict(self._chapter_row(name, 1), replaced=False, existing=True)
+            self._conn.execute(
+                "INSERT INTO projects (name, premise, genre, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET premise = excluded.premise, genre = excluded.genre, updated_at = excluded.updated_at",
+                (name, premise, genre, now, now),
+            )
+            replaced = self._revise(name, 1, text, "recreate", None, now)
+            if replaced:
+                self._conn.execute("UPDATE chapters SET title = ? WHERE project = ? AND number = 1", (title, name))
+            else:
+                first, rest, words = self._text_pieces(text)
+                cursor = self._conn.execute(
+                    "INSERT INTO chapters (project, number, title, text, word_count, created_at, updated_at) "
+                    "VALUES (?, 1, ?, ?, ?, ?, ?)",
+                    (name, title, first, words, now, now),
+                )
+                self._append_text(cursor.lastrowid, rest)
+        return dict(self.chapter(name, 1), replaced=replaced)
+
+    def existing_story(self, name: str, premise: str) -> dict:
+        """Chapter 1 of the story start_project made from `premise` under `name`, or None"""
+        with self._lock:
+            name, existing = self._story_key(name, premise)
+            return dict(self._chapter_row(name, 1)) if existing else None
+
+    def _story_key(self, name: str, premise: str) -> tuple:
+        """(key, True) for the key holding the story started from `premise`, else (first free key, False)"""
+        for n in itertools.count(1):
+            key = name if n == 1 else f"{name} ({n})"
+            row = self._conn.execute(
+                "SELECT p.premise FROM chapters c LEFT JOIN projects p ON p.name = c.project "
+                "WHERE c.project = ? AND c.number = 1",
+                (key,),
+            ).fetchone()
+            if row is None and not self._conn.execute("SELECT 1 FROM chapters WHERE project = ? LIMIT 1", (key,)).fetchone():
+                return key, False
+            if row is not None and row["premise"] == premise:
+                return key, True
+
+    def append_chapter(self, project: str, title: str, text) -> dict:
+        """
+        Store `text` as the project's next chapter; the number is assigned atomically.
+        If the latest chapter already has exactly this text (a retried or coalesced request),
+        that chapter is returned with `deduplicated` set instead of adding a copy.
+        """
+        now = datetime.now().isoformat()
+        first, rest, words = self._text_pieces(text)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO chapters (project, number, title, text, word_count, created_at, updated_at) "
+                "SELECT ?, COALESCE(MAX(number), 0) + 1, ?, ?, ?, ?, ? FROM chapters WHERE project = ?",
+                (project, title, first, words, now, now, project),
+            )
+            self._append_text(cursor.lastrowid, rest)
+            number = self._conn.execute("SELECT number FROM chapters WHERE rowid = ?", (cursor.lastrowid,)).fetchone()[0]
+            duplicate = self._conn.execute(  # compared inside SQLite, so the latest chapter is never loaded
+                "SELECT 1 FROM chapters added JOIN chapters latest "
+                "ON latest.project = added.project AND latest.number = added.number - 1 "
+                "WHERE added.rowid = ? AND latest.text = added.text",
+                (cursor.lastrowid,),
+            ).fetchone()
+            if duplicate:
+                self._conn.execute("DELETE FROM chapters WHERE rowid = ?", (cursor.lastrowid,))
+                return dict(self._chapter_row(project, number - 1), deduplicated=True)
+            self._conn.execute(
+                "INSERT INTO projects (name, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET updated_at = excluded.updated_at",
+                (project, now, now),
+            )
+        return self.chapter(project, number)
+
+    @staticmethod
+    def _text_pieces(text) -> tuple:
+        """(first piece, the remaining pieces, word count) of a str or a ChapterSpool"""
+        if isinstance(text, ChapterSpool):
+            chunks = text.chunks()
+            return next(chunks, ""), chunks, text.words
+        return text, (), count_words(text)
+
+    def _append_text(self, rowid: int, pieces):
+        for piece in pieces:
+            self._conn.execute("UPDATE chapters SET text = text || ? WHERE rowid = ?", (piece, rowid))
+
+    def _chapter_row(self, project: str, number: int, with_text: bool = False) -> sqlite3.Row:
+        columns = ", ".join(CHAPTER_FIELDS + (("text",) if with_text else ()))
+        return self._conn.execute(
+            f"SELECT {columns} FROM chapters WHERE project = ? AND number = ?", (project, number)
+        ).fetchone()
+
+    def revise_chapter(self, project: str, number: int, text, mode: str = "full", feedback: str = None) -> dict:
+        """
+        Replace a chapter's text as a new revision, storing a paragraph-level diff against
+        the text it replaces. None if the chapter doesn't exist.
+        """
+        with self._lock, self._conn:
+            if not self._revise(project, number, text, mode, feedback, datetime.now().isoformat()):
+                return None
+        return self.chapter(project, number)
+
+    def _revise(self, project: str, number: int, text, mode: str, feedback: str, now: str) -> bool:
+        """revise_chapter inside the caller's lock and transaction; False if the chapter doesn't exist"""
+        current = self._chapter_row(project, number, with_text=True)
+        if current is None:
+            return False
+        if isinstance(text, ChapterSpool):
+            text = text.read_text()  # the diff needs both versions whole
+        revision = current["revision"] + 1
+        self._conn.execute(
+            "UPDATE chapters SET text = ?, word_count = ?, revision = ?, "
+            "upload_id = NULL, drive_status = NULL, updated_at = ? WHERE project = ? AND number = ?",
+            (text, count_words(text), revision, now, project, number),
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO revisions (project, number, revision, mode, feedback, diff, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (project, number, revision, mode, feedback,
+             paragraph_diff(current["text"], text, f"Chapter {number} r{current['revision']}->r{revision}"), now),
+        )
+        return True
+
+    def revisions(self, project: str, number: int) -> list:
+        """Stored diffs for a chapter, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT revision, mode, feedback, diff, created_at FROM revisions "
+                "WHERE project = ? AND number = ? ORDER BY revision DESC",
+                (project, number),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def chapter(self, project: str, number: int, with_text: bool = False) -> dict:
+        with self._lock:
+            row = self._chapter_row(project, number, with_text)
+        return dict(row) if row else None
+
+    def chapter_text(self, project: str, number: int) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM chapters WHERE project = ? AND number = ?", (project, number)
+            ).fetchone()
+        return row["text"] if row else None
+
+    def chapter_texts(self, project: str):
+        """
+        Chapter rows with their text, in chapter order, from a read-only connection of their
+        own: with WAL a long read neither takes the index lock nor blocks writers
+        """
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(CHAPTER_FIELDS)}, text FROM chapters WHERE project = ? ORDER BY number", (project,)
+            )
+            for row in cursor:
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def chapters(self, project: str) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(CHAPTER_FIELDS)} FROM chapters WHERE project = ? ORDER BY number", (project,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def project(self, name: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.*, COUNT(c.number) AS chapters, COALESCE(SUM(c.word_count), 0) AS word_count "
+                "FROM projects p LEFT JOIN chapters c ON c.project = p.name WHERE p.name = ? GROUP BY p.name",
+                (name,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def link_upload(self, project: str, number: int, upload: dict):
+        """Attach the staged upload for a chapter (and its Drive fields, if it is already done)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE chapters SET upload_id = ? WHERE project = ? AND number = ?",
+                (upload["id"], project, number),
+            )
+        self.record_upload(upload)
+
+    def record_upload(self, upload: dict):
+        """Copy an upload record's status and Drive file id onto the chapter it belongs to"""
+        drive_info = upload.get("drive") or {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE chapters SET drive_status = ?, drive_file_id = ?, drive_link = ? WHERE upload_id = ?",
+                (upload["status"], drive_info.get("file_id"), drive_info.get("link"), upload["id"]),
+            )
+
+    def pending_uploads(self) -> list:
+        """Upload ids of chapters whose Drive copy was not confirmed yet"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id FROM chapters WHERE upload_id IS NOT NULL AND drive_status = 'pending'"
+            ).fetchall()
+        return [row["upload_id"] for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            projects = self._conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+            row = self._conn.execute(
+                "SELECT COUNT(*), SUM(CASE WHEN drive_status = 'uploaded' THEN 1 ELSE 0 END) FROM chapters"
+            ).fetchone()
+        return {"projects": projects, "chapters": row[0], "synced_to_drive": row[1] or 0}
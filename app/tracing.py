@@ -0,0 +1,288 @@
+"""
+ISABELLA - REQUEST TRACING
+Lightweight spans kept in a context variable, trace ids taken from the incoming
+traceparent / X-Trace-Id header, head sampling plus tail retention of slow or failed
+requests, and pluggable exporters (JSONL file, stdout)
+"""
+
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+
+_current = ContextVar("isabella_trace_span", default=None)
+
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+class Span:
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: str = None, sampled: bool = False,
+                 local_root: bool = False, attributes: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.local_root = local_root
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _SpanScope:
+    """Context manager that makes a span current and finishes it on exit"""
+
+    def __init__(self, span: Span):
+        self.span = span
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        self.span.tracer._finish(self.span)
+        return False
+
+
+class JsonlExporter:
+    """Appends one JSON object per span to a file, rotating it to `<file>.1` past `max_bytes`"""
+
+    def __init__(self, path: Path, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, spans: list):
+        lines = "".join(json.dumps(span) + "\n" for span in spans)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+class StdoutExporter:
+    def export(self, spans: list):
+        for span in spans:
+            print(f"TRACE {json.dumps(span)}")
+
+
+class Tracer:
+    """
+    Every span is recorded; whether a trace is exported is decided when its local root span
+    ends: exported if head-sampled (sample rate or an upstream sampled flag), slower than
+    `slow_seconds`, or failed. Spans finishing after their root (write-behind Drive uploads)
+    follow the recorded decision, and are also kept if they are slow or failed themselves.
+    """
+
+    def __init__(self, exporters: list = None, sample_rate: float = 0.1, slow_seconds: float = 60.0,
+                 max_open_traces: int = 10000):
+        self.exporters = list(exporters or [])
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.max_open_traces = max_open_traces
+        self._open = OrderedDict()  # trace_id -> finished spans waiting for the root
+        self._decisions = OrderedDict()  # trace_id -> exported?
+        self._active_roots = set()  # traces whose local root span is still running
+        self._lock = threading.Lock()
+        self.exported_traces = 0
+        self.sampled_traces = 0
+        self.slow_traces = 0
+        self.failed_traces = 0
+        self.dropped_traces = 0
+        self.export_errors = 0
+
+    def add_exporter(self, exporter):
+        """Any object with `export(spans: list[dict])`"""
+        self.exporters.append(exporter)
+
+    def span(self, name: str, traceparent: str = None, trace_id: str = None, **attributes) -> _SpanScope:
+        """
+        Child of the current span, or a new local root. A root continues the trace in
+        `traceparent` (W3C header) or `trace_id` when given, otherwise starts a fresh one.
+        """
+        parent = _current.get()
+        if parent is not None:
+            return _SpanScope(Span(self, name, parent.trace_id, parent.span_id, parent.sampled, attributes=attributes))
+
+        parent_id, sampled = None, random.random() < self.sample_rate
+        match = TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_id = match.group(1), match.group(2)
+            sampled = sampled or match.group(3) == "01"
+        elif not (trace_id and TRACE_ID.match(trace_id)):
+            trace_id = uuid.uuid4().hex
+        with self._lock:
+            # Resumed inside a request that is still running here (e.g. a worker thread): just a child
+            local_root = trace_id not in self._active_roots
+            if local_root:
+                self._active_roots.add(trace_id)
+        return _SpanScope(Span(self, name, trace_id, parent_id, sampled, local_root, attributes))
+
+    def _finish(self, span: Span):
+        span.duration = time.perf_counter() - span._started
+        record = span.to_dict()
+        with self._lock:
+            decided = self._decisions.get(span.trace_id)
+            if not span.local_root and decided is None:
+                self._open.setdefault(span.trace_id, []).append(record)
+                while len(self._open) > self.max_open_traces:
+                    self._open.popitem(last=False)
+                    self.dropped_traces += 1
+                return
+            spans = self._open.pop(span.trace_id, []) + [record]
+            if span.local_root:
+                self._active_roots.discard(span.trace_id)
+            slow = span.duration >= self.slow_seconds
+            keep = bool(decided) or span.sampled or slow or span.error is not None
+            if span.local_root and decided is None:
+                self._decisions[span.trace_id] = keep
+                while len(self._decisions) > self.max_open_traces:
+                    self._decisions.popitem(last=False)
+                if keep:
+                    self.exported_traces += 1
+                    self.sampled_traces += span.sampled
+                    self.slow_traces += slow and not span.sampled
+                    self.failed_traces += span.error is not None and not (slow or span.sampled)
+                else:
+                    self.dropped_traces += 1
+        if keep:
+            self._export(spans)
+
+    def _export(self, spans: list):
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                self.export_errors += 1
+                print(f"WARNING: Trace export failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_seconds": self.slow_seconds,
+            "exporters": [type(exporter).__name__ for exporter in self.exporters],
+            "exported_traces": self.exported_traces,
+            "sampled": self.sampled_traces,
+            "kept_slow": self.slow_traces,
+            "kept_failed": self.failed_traces,
+            "dropped": self.dropped_traces,
+            "open_traces": len(self._open),
+            "export_errors": self.export_errors,
+        }
+
+
+tracer = Tracer()
+
+
+def current_span() -> Span:
+    return _current.get()
+
+
+def current_traceparent() -> str:
+    span = _current.get()
+    return span.traceparent() if span else None
+
+
+def traced(name: str = None):
+    """Decorator: run a (sync or async) function inside a child span named after it"""
+    def decorate(fn):
+        span_name = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def resume_trace(traceparent: str, name: str, fn):
+    """Wrap `fn` (e.g. for a worker thread) so it runs in a span continuing `traceparent`"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(None)
+        try:
+            with tracer.span(name, traceparent=traceparent):
+                return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: opens the root span for each HTTP request, continuing the trace
+    from a `traceparent` or `X-Trace-Id` header, and returns the trace id as `X-Trace-Id`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        scope_span = tracer.span(
+            f"{scope['method']} {scope['path']}",
+            traceparent=headers.get(b"traceparent", b"").decode("latin-1"),
+            trace_id=headers.get(b"x-trace-id", b"").decode("latin-1"),
+            method=scope["method"], path=scope["path"],
+        )
+
+        with scope_span as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set(status=message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                if span.attributes.get("status", 500) >= 500 and span.error is None:
+                    span.error = f"HTTP {span.attributes.get('status', 500)}"
@@ -0,0 +1,231 @@
+"""
+ISABELLA - WRITE-BEHIND DRIVE UPLOADS
+Chapters are staged on local disk and uploaded by a dedicated worker pool
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from app.cache import TTLCache
+from app.spool import ChapterSpool
+from app.tracing import current_traceparent, resume_trace
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Write via temp file + fsync + rename so a crash never leaves a torn file"""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class UploadPipeline:
+    """
+    Write-behind queue in front of a blocking
+    `upload_fn(project_name, chapter_title, path, chapter_num, session, checkpoint) -> dict`,
+    where `path` is the staged chapter file and `session` is a dict kept in the upload record
+    (saved by `checkpoint()`) so a resumable upload can continue after a retry or restart.
+
+    stage() returns as soon as the chapter is durably on disk; a streamed chapter can be
+    written straight into the staging directory through spool() and staged from there.
+    Uploads for the same
+    project run one at a time in staging order; different projects upload in parallel
+    up to `workers`. Failed uploads are retried with exponential backoff, and anything
+    still pending at startup is replayed. `on_done(meta)` is called once an upload
+    succeeds or gives up.
+    """
+
+    def __init__(self, staging_dir: Path, upload_fn, workers: int = 1, max_attempts: int = 5, base_delay: float = 2.0,
+                 on_done=None):
+        self.staging_dir = staging_dir
+        self.upload_fn = upload_fn
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.on_done = on_done
+        self._executor = None
+        self._project_queues = {}
+        self._project_tasks = {}
+        self._waiters = {}
+        self._recent = TTLCache(maxsize=1024, ttl=600)  # dedupe key -> upload id
+        self.uploaded = 0
+        self.failed = 0
+        self.retries = 0
+        self.deduplicated = 0
+
+    async def start(self):
+        """Start the worker pool and replay uploads left pending by a previous process"""
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="drive-upload")
+        for orphan in self.staging_dir.glob("*.part"):
+            orphan.unlink()  # spool of a stream that never finished
+        pending = [meta for meta in map(self._read_meta, self.staging_dir.glob("*.json")) if meta["status"] == "pending"]
+        for meta in sorted(pending, key=lambda meta: meta["staged_at"]):
+            self._schedule(meta)
+        if pending:
+            print(f"✓ Uploads: replaying {len(pending)} staged upload(s)")
+
+    async def stop(self):
+        for task in list(self._project_tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._project_tasks.values(), return_exceptions=True)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def spool(self) -> ChapterSpool:
+        """A file in the staging directory to stream a chapter into before stage()"""
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        return ChapterSpool(self.staging_dir / f"{uuid.uuid4().hex}.part")
+
+    def stage(self, project_name: str, chapter_title: str, content, chapter_num: int = None) -> dict:
+        """
+        Persist the chapter (text or a ChapterSpool) locally and queue it for upload; returns the
+        pending upload record. Staging the same chapter again shortly after (e.g. a client retry)
+        returns the existing upload.
+        """
+        if isinstance(content, ChapterSpool):
+            content.close()
+            digest = content.digest
+        else:
+            data = content.encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+        dedupe_key = hashlib.sha256(
+            json.dumps([project_name, chapter_title, chapter_num, digest]).encode("utf-8")
+        ).hexdigest()
+        previous_id = self._recent.get(dedupe_key)
+        existing = self.get(previous_id) if previous_id else None
+        if existing is not None and existing["status"] != "failed":
+            self.deduplicated += 1
+            if isinstance(content, ChapterSpool):
+                content.discard()
+            return existing
+
+        upload_id = uuid.uuid4().hex
+        if isinstance(content, ChapterSpool):
+            os.replace(content.path, self._text_path(upload_id))
+        else:
+            _write_atomic(self._text_path(upload_id), data)
+        meta = {
+            "id": upload_id,
+            "project_name": project_name,
+            "chapter_title": chapter_title,
+            "chapter_num": chapter_num,
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "drive": None,
+            "staged_at": time.time(),
+            "created_at": datetime.now().isoformat(),
+            "traceparent": current_traceparent(),
+        }
+        self._write_meta(meta)
+        self._schedule(meta)
+        self._recent.set(dedupe_key, upload_id)
+        return meta
+
+    async def call(self, fn, *args):
+        """Run a blocking Drive call on the upload worker pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def get(self, upload_id: str) -> dict:
+        path = self._meta_path(upload_id)
+        return self._read_meta(path) if path.exists() else None
+
+    async def wait(self, upload_id: str, timeout: float = None) -> dict:
+        """Wait until the upload succeeds or gives up, and return its final record"""
+        meta = self.get(upload_id)
+        if meta is None or meta["status"] != "pending":
+            return meta
+        waiter = self._waiters.setdefault(upload_id, asyncio.get_running_loop().create_future())
+        return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": sum(queue.qsize() for queue in self._project_queues.values()) + len(self._project_tasks),
+            "active_projects": len(self._project_tasks),
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "deduplicated": self.deduplicated,
+        }
+
+    def _text_path(self, upload_id: str) -> Path:
+        return self.staging_dir / f"{upload_id}.txt"
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.staging_dir / f"{upload_id}.json"
+
+    def _read_meta(self, path: Path) -> dict:
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _write_meta(self, meta: dict):
+        _write_atomic(self._meta_path(meta["id"]), json.dumps(meta).encode("utf-8"))
+
+    def _schedule(self, meta: dict):
+        project = meta["project_name"]
+        queue = self._project_queues.setdefault(project, asyncio.Queue())
+        queue.put_nowait(meta["id"])
+        if project not in self._project_tasks:
+            self._project_tasks[project] = asyncio.create_task(self._drain(project))
+
+    async def _drain(self, project: str):
+        """Upload one project's chapters strictly in order, then exit when its queue is empty"""
+        queue = self._project_queues[project]
+        try:
+            while not queue.empty():
+                await self._upload(queue.get_nowait())
+        finally:
+            # Anything left (only on shutdown) is still pending on disk and replays at next start
+            del self._project_tasks[project]
+            del self._project_queues[project]
+
+    async def _upload(self, upload_id: str):
+        loop = asyncio.get_running_loop()
+        meta = self.get(upload_id)
+        while meta["status"] == "pending":
+            meta["attempts"] += 1
+            try:
+                meta["drive"] = await loop.run_in_executor(
+                    self._executor,
+                    resume_trace(meta.get("traceparent"), "drive_upload", self.upload_fn),
+                    meta["project_name"], meta["chapter_title"], self._text_path(upload_id), meta["chapter_num"],
+                    meta.setdefault("session", {}), lambda: self._write_meta(meta)
+                )
+                meta.pop("session", None)
+                meta["status"] = "uploaded"
+                meta["error"] = None
+                self.uploaded += 1
+                self._text_path(upload_id).unlink(missing_ok=True)
+            except Exception as e:
+                meta["error"] = str(e)
+                if meta["attempts"] >= self.max_attempts:
+                    meta["status"] = "failed"  # staged text is kept for manual replay
+                    self.failed += 1
+                    print(f"ERROR: Drive upload {upload_id} failed after {meta['attempts']} attempts: {str(e)}")
+                else:
+                    self.retries += 1
+                    delay = min(60.0, self.base_delay * 2 ** (meta["attempts"] - 1)) * random.uniform(0.5, 1.5)
+                    self._write_meta(meta)
+                    await asyncio.sleep(delay)
+                    continue
+            self._write_meta(meta)
+
+        if self.on_done:
+            try:
+                self.on_done(meta)
+            except Exception as e:
+                print(f"WARNING: Upload {upload_id} completion hook failed: {str(e)}")
+        waiter = self._waiters.pop(upload_id, None)
+        if waiter and not waiter.done():
+            waiter.set_result(meta)
@@ -0,0 +1,341 @@
+"""
+ISABELLA - OFFLINE BENCHMARK
+Runs the FastAPI app in-process against the mock LLM provider and a fake Google Drive,
+drives concurrent load per scenario, reports RPS, p50/p95/p99 latency and event-loop lag,
+times a cold `import app.main`, and compares the results against a stored baseline
+(exit code 1 on a regression).
+
+    python benchmark_isabella.py                          # run and compare to benchmark_baseline.json
+    python benchmark_isabella.py --save-baseline          # record a new baseline
+    python benchmark_isabella.py --scenarios create,stream --concurrency 32 --requests 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENARIOS = ("create", "continue", "stream", "status")
+BASELINE_FILE = Path(__file__).with_name("benchmark_baseline.json")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for Isabella")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock provider time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="mock provider token rate (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock provider calls that fail")
+    parser.add_argument("--words", type=int, default=400, help="words per mock completion")
+    parser.add_argument("--drive-latency", type=float, default=0.02, help="fake Drive time per API call (s)")
+    parser.add_argument("--drive-pool-size", type=int, default=8, help="Drive clients (and upload workers)")
+    parser.add_argument("--import-runs", type=int, default=5, help="cold imports of app.main to time (0 = skip)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+    parser.add_argument("--output", type=Path, help="also write the results to this JSON file")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the app at the mock provider and a throwaway data dir (must run before importing app.main)"""
+    os.environ.update({
+        "API_PROVIDER": "mock",
+        "MOCK_LATENCY": str(args.latency),
+        "MOCK_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        "ISABELLA_DATA_DIR": tempfile.mkdtemp(prefix="isabella-bench-"),
+        "GENERATION_CACHE": "0",
+        "GENERATION_MAX_QUEUE": str(max(args.concurrency * 4, 32)),
+        "TRACE_EXPORTER": "none",
+        "DRIVE_POOL_SIZE": str(args.drive_pool_size),
+        "ROUTER_FAILURE_THRESHOLD": "1000000",
+    })
+    os.environ.pop("GOOGLE_OAUTH_TOKEN_JSON", None)
+
+
+# ========================================
+# FAKE GOOGLE DRIVE
+# ========================================
+
+class FakeDriveRequest:
+    def __init__(self, drive, result):
+        self.drive = drive
+        self.result = result
+
+    def execute(self, *args, **kwargs):
+        time.sleep(self.drive.latency)  # the real client blocks its thread too
+        self.drive.calls += 1
+        return self.result()
+
+
+class FakeDriveFiles:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q=None, **kwargs):
+        return FakeDriveRequest(self.drive, lambda: {"files": [
+            {"id": file_id, "name": name} for file_id, name in self.drive.folders.items() if f"name='{name}'" in (q or "")
+        ]})
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            file_id = f"file-{next(self.drive.ids)}"
+            if body.get("mimeType") == "application/vnd.google-apps.folder":
+                self.drive.folders[file_id] = body["name"]
+            else:
+                self.drive.uploaded[file_id] = body["name"]
+            return {"id": file_id, "webViewLink": f"https://drive.example/{file_id}"}
+        return FakeDriveRequest(self.drive, run)
+
+
+class FakeDrive:
+    """Enough of the Drive v3 client for folder lookups and chapter uploads (one instance backs every pooled client)"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.folders = {}
+        self.uploaded = {}
+        self.ids = itertools.count(1)
+
+    def files(self):
+        return FakeDriveFiles(self)
+
+
+# ========================================
+# LOAD GENERATION
+# ========================================
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+class LoopLagSampler:
+    """How late a short periodic timer fires while the load runs (blocking work shows up here)"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def scenario_request(name: str, i: int, projects: list):
+    """(method, path, json body) for the i-th request of a scenario"""
+    if name == "create":
+        return "POST", "/story/create", {
+            "prompt": f"Benchmark story {i}: a lighthouse keeper finds a letter", "length": "short",
+            "project_name": f"Bench_Create_{i % 8}", "cache": False, "overwrite": True,
+        }
+    if name == "continue":
+        return "POST", "/story/continue", {"project_name": projects[i % len(projects)], "context": "Raise the stakes."}
+    if name == "stream":
+        return "POST", "/story/create/stream", {
+            "prompt": f"Benchmark stream {i}: a cartographer maps a city that moves", "length": "short",
+            "project_name": f"Bench_Stream_{i % 8}", "overwrite": True,
+        }
+    return "GET", "/story/status", None
+
+
+async def run_scenario(client, name: str, args, projects: list) -> dict:
+    latencies, errors = [], 0
+    counter = itertools.count()
+    sampler = LoopLagSampler()
+
+    async def worker():
+        nonlocal errors
+        for i in iter(lambda: next(counter), None):
+            if i >= args.requests:
+                return
+            method, path, body = scenario_request(name, i, projects)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                failed = response.status_code >= 400 or (name == "stream" and "event: error" in response.text)
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - started
+    await sampler.stop()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": round(errors / max(1, len(latencies)), 4),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "loop_lag_p99": round(percentile(sampler.samples, 99), 4),
+        "loop_lag_max": round(max(sampler.samples, default=0.0), 4),
+    }
+
+
+def measure_import(runs: int) -> dict:
+    """Wall time of `import app.main` in fresh interpreters (what every worker pays before serving)"""
+    code = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=Path(__file__).parent, env=os.environ,
+            capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return {"runs": runs, "median_seconds": round(statistics.median(times), 3), "min_seconds": round(min(times), 3)}
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    import app.main as isabella
+    from app.drive_pool import DriveClientPool
+
+    drive = FakeDrive(args.drive_latency)
+    isabella.drive = DriveClientPool(lambda: drive, isabella.DRIVE_POOL_SIZE)
+    isabella.mock_provider.words = args.words
+
+    results = {}
+    await isabella.app.router.startup()
+    print(f"\nStartup: {isabella.startup_timings}")
+    try:
+        transport = httpx.ASGITransport(app=isabella.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://isabella.bench", timeout=300) as client:
+            projects = []
+            if "continue" in args.scenarios:
+                for i in range(min(8, args.requests)):
+                    name = f"Bench_Continue_{i}"
+                    await client.post("/story/create", json={"prompt": f"Seed story {i}", "length": "short", "project_name": name, "cache": False})
+                    projects.append(name)
+
+            for name in args.scenarios:
+                print(f"\n{name}: {args.requests} requests, concurrency {args.concurrency} ...")
+                results[name] = await run_scenario(client, name, args, projects)
+                r = results[name]
+                print(f"  {r['rps']} req/s | p50 {r['p50']}s p95 {r['p95']}s p99 {r['p99']}s | "
+                      f"errors {r['errors']} | loop lag p99 {r['loop_lag_p99'] * 1000:.1f}ms max {r['loop_lag_max'] * 1000:.1f}ms")
+
+            # Write-behind Drive uploads and story memory updates still queued after the load
+            started = time.perf_counter()
+            while (isabella.upload_pipeline.stats()["pending"] or isabella.story_memory.stats()["pending"]) \
+                    and time.perf_counter() - started < 120:
+                await asyncio.sleep(0.05)
+            print(f"\nBackground backlog (Drive uploads, story memory) drained in {time.perf_counter() - started:.2f}s")
+    finally:
+        await isabella.app.router.shutdown()
+    print(f"\nFake Drive: {drive.calls} calls, {len(drive.uploaded)} files, {len(drive.folders)} folders")
+    return results
+
+
+# ========================================
+# BASELINE COMPARISON
+# ========================================
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `report` against `baseline` (throughput, tail latency, errors, loop lag, import time)"""
+    regressions = []
+    current, base = report.get("import"), baseline.get("import")
+    if current and base and current["median_seconds"] > base["median_seconds"] * (1 + tolerance) + 0.1:
+        regressions.append(f"import app.main: {current['median_seconds']}s > baseline {base['median_seconds']}s")
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['rps']} req/s < baseline {base['rps']} req/s")
+        for key in ("p95", "p99"):
+            if current[key] > base[key] * (1 + tolerance) + 0.05:
+                regressions.append(f"{name}: {key} {current[key]}s > baseline {base[key]}s")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']} > baseline {base['error_rate']}")
+        if current["loop_lag_p99"] > base["loop_lag_p99"] * (1 + tolerance) + 0.05:
+            regressions.append(f"{name}: event-loop lag p99 {current['loop_lag_p99']}s > baseline {base['loop_lag_p99']}s")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(unknown)}")
+    configure_environment(args)
+
+    print("=" * 80)
+    print("ISABELLA - OFFLINE BENCHMARK")
+    print("=" * 80)
+    print(f"Mock provider: {args.latency}s latency, {args.tokens_per_second} tok/s, {args.error_rate:.0%} errors, "
+          f"{args.words} words | Fake Drive: {args.drive_latency}s per call")
+
+    imports = None
+    if args.import_runs:
+        imports = measure_import(args.import_runs)
+        print(f"\nimport app.main: median {imports['median_seconds']}s, min {imports['min_seconds']}s ({args.import_runs} runs)")
+
+    results = asyncio.run(benchmark(args))
+    report = {
+        "config": {key: getattr(args, key) for key in (
+            "requests", "concurrency", "latency", "tokens_per_second", "error_rate", "words", "drive_latency",
+            "drive_pool_size"
+        )},
+        "import": imports,
+        "scenarios": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    print(f"\n{'=' * 80}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"✓ Baseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline} (run with --save-baseline to record one)")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("config") != report["config"]:
+        print("WARNING: Benchmark settings differ from the baseline's; comparison may not be meaningful")
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print("✗ PERFORMANCE REGRESSIONS:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print(f"✓ No regressions against {args.baseline.name} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+LOCAL ROUTING TEST
+Runs the provider router against mock providers, offline: failover, a circuit opening,
+its half-open trial (failing, then recovering), all circuits open, and hedged requests
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.mock_provider import MockProvider
+from app.routing import ProviderRouter, ProviderError
+
+ARGS = ("gpt-4o", "You are a storyteller.", "Write a line.", 50, None)
+
+
+# ========================================
+# TESTS
+# ========================================
+
+results = []
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    results.append(ok)
+    print(f"{'✓' if ok else '✗'} {name}{f' ({detail})' if detail else ''}")
+
+
+def mocks(**overrides) -> dict:
+    providers = {"openai": MockProvider(latency=0.01, words=20), "openrouter": MockProvider(latency=0.03, words=20)}
+    for name, settings in overrides.items():
+        for key, value in settings.items():
+            setattr(providers[name], key, value)
+    return providers
+
+
+def router_for(providers: dict, **kwargs) -> ProviderRouter:
+    return ProviderRouter(
+        {name: provider.complete for name, provider in providers.items()}, ["openai", "openrouter"], **kwargs
+    )
+
+
+async def test_failover():
+    print("\n[1] Primary failing: calls fail over")
+    providers = mocks(openai={"error_rate": 1.0})
+    router = router_for(providers, failure_threshold=3, cooldown=60)
+    result = await router.call(*ARGS)
+    check("call answered by the backup", bool(result.text) and providers["openrouter"].calls == 1)
+    check("failover counted", router.failovers == 1)
+
+
+async def test_circuit():
+    print("\n[2] Circuit opens, then recovers through a half-open trial")
+    providers = mocks(openai={"error_rate": 1.0})
+    router = router_for(providers, failure_threshold=3, cooldown=0.2)
+    for _ in range(3):
+        await router.call(*ARGS)
+    check("circuit open after 3 failures", router.health["openai"].state == "open")
+    before = providers["openai"].calls
+    await router.call(*ARGS)
+    check("open circuit takes no traffic", providers["openai"].calls == before and router.candidates() == ["openrouter"])
+
+    await asyncio.sleep(0.25)
+    check("half-open after the cooldown", router.health["openai"].available() and router.health["openai"].state == "half_open")
+    await router.call(*ARGS)
+    check("failed trial reopens the circuit", router.health["openai"].state == "open", f"{providers['openai'].calls - before} trial call")
+
+    providers["openai"].error_rate = 0.0
+    await asyncio.sleep(0.25)
+    await router.call(*ARGS)
+    check("successful trial closes the circuit", router.health["openai"].state == "closed")
+    check("primary back in rotation", "openai" in router.candidates(), f"order {router.candidates()}")
+
+
+async def test_all_open():
+    print("\n[3] Every circuit open")
+    providers = mocks(openai={"error_rate": 1.0}, openrouter={"error_rate": 1.0})
+    router = router_for(providers, failure_threshold=1, cooldown=60)
+    try:
+        await router.call(*ARGS)
+    except ProviderError:
+        pass
+    states = [health.state for health in router.health.values()]
+    check("both circuits open", states == ["open", "open"])
+    providers["openai"].error_rate = 0.0
+    result = await router.call(*ARGS)
+    check("still tries the circuit that opened first", bool(result.text) and router.health["openai"].state == "closed")
+
+
+async def test_hedging():
+    print("\n[4] Hedged request: slow primary, backup wins")
+    providers = mocks()
+    router = router_for(providers, hedge=True, hedge_min_delay=0.05, min_samples=5)
+    for _ in range(12):  # cold providers score best, so both get sampled before the faster one settles on top
+        await router.call(*ARGS)
+    check("faster provider ranked first", router.candidates()[0] == "openai", f"order {router.candidates()}")
+    check("no hedging while the primary is fast", router.hedged == 0)
+
+    providers["openai"].latency = 1.0
+    started = time.perf_counter()
+    result = await router.call(*ARGS)
+    elapsed = time.perf_counter() - started
+    check("backup answered after the hedge delay", bool(result.text) and elapsed < 0.5, f"{elapsed:.2f}s")
+    check("hedge and win counted", router.hedged == 1 and router.hedge_wins == 1)
+    check("cancelled primary not counted as a failure", router.health["openai"].error_rate() == 0.0)
+
+    print("\n[5] Hedged request: primary fails before the delay")
+    providers["openai"].latency, providers["openai"].error_rate = 0.01, 1.0
+    result = await router.call(*ARGS)
+    check("fails over to the backup", bool(result.text) and router.failovers == 1)
+
+
+async def run():
+    await test_failover()
+    await test_circuit()
+    await test_all_open()
+    await test_hedging()
+
+
+def main():
+    print("=" * 70)
+    print("ISABELLA - LOCAL ROUTING TEST (mock providers)")
+    print("=" * 70)
+    asyncio.run(run())
+
+    print(f"\n{'=' * 70}")
+    print(f"{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()